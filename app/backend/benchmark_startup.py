@@ -0,0 +1,80 @@
+# Banking API Backend - Cold start benchmark
+#
+# Measures the time from process spawn to the first successful request, the
+# number that bounds how fast HPA scale-ups can absorb a traffic spike.
+#
+#   python benchmark_startup.py --runs 5
+#   FAST_STARTUP=true python benchmark_startup.py --runs 5
+#
+# Requires reachable Postgres/Redis (DATABASE_URL / REDIS_URL), same as the app.
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def measure_import() -> float:
+    """Seconds spent importing main in a fresh interpreter."""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL)
+    return float(output.decode().strip().splitlines()[-1])
+
+def measure_first_request(port: int, path: str, timeout: float):
+    """Seconds from spawning uvicorn until `path` answers 200, and the time the
+    startup event itself took (from the app's own log line)."""
+    url = f"http://127.0.0.1:{port}{path}"
+    log = tempfile.TemporaryFile(mode="w+")
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.perf_counter() - started
+                        break
+            except OSError:
+                time.sleep(0.01)
+        else:
+            raise TimeoutError(f"{url} not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+    log.seek(0)
+    match = re.search(r"started successfully in (\d+)ms", log.read())
+    return ready, int(match.group(1)) / 1000 if match else None
+
+def summarize(name: str, samples):
+    ms = [sample * 1000 for sample in samples]
+    print(f"{name:<28} median={statistics.median(ms):8.1f}ms  min={min(ms):8.1f}ms  max={max(ms):8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Banking API cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/health", help="endpoint that marks the pod as ready")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"FAST_STARTUP={os.getenv('FAST_STARTUP', 'false')} runs={args.runs} path={args.path}")
+    summarize("import main", [measure_import() for _ in range(args.runs)])
+    runs = [measure_first_request(args.port, args.path, args.timeout) for _ in range(args.runs)]
+    summarize("spawn -> first request", [ready for ready, _ in runs])
+    if all(startup is not None for _, startup in runs):
+        summarize("startup event", [startup for _, startup in runs])
+
+if __name__ == "__main__":
+    main()
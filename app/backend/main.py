@@ -1,21 +1,30 @@
 # Banking API Backend - FastAPI Application
-from fastapi import FastAPI, HTTPException, Depends, status, Response, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, validator, field_validator
+from pydantic import AfterValidator
+from pydantic_core import core_schema
+from typing import Annotated, List, Optional
 import asyncpg
 import redis.asyncio as redis
-import boto3
 import json
 import os
 import hashlib
 import jwt
-from datetime import datetime, timedelta
-from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
 import logging
 import uuid
+import sys
+import time
+import hmac
+import threading
+import asyncio
+import calendar
+import math
+import random
+from collections import Counter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,7 +45,10 @@ security = HTTPBearer()
 # Middleware for request logging
 @app.middleware("http")
 async def log_requests(request, call_next):
-    logger.info(f"Request: {request.method} {request.url} - Headers: {dict(request.headers)}")
+    headers = dict(request.headers)
+    if config.PROFILE_HEADER.lower() in headers:
+        headers[config.PROFILE_HEADER.lower()] = "***"
+    logger.info(f"Request: {request.method} {request.url} - Headers: {headers}")
     response = await call_next(request)
     logger.info(f"Response: {response.status_code}")
     return response
@@ -57,20 +69,335 @@ class Config:
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
     JWT_ALGORITHM = "HS256"
     JWT_EXPIRE_MINUTES = 30
+    # Token revocation: revoked jtis are mirrored into a per-pod Bloom filter
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "1000000"))
+    REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+    REVOCATION_REBUILD_SECONDS = int(os.getenv("REVOCATION_REBUILD_SECONDS", "3600"))
     AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+    # Account shards; the first one is also the directory database (users).
+    # Defaults to a single shard on DATABASE_URL.
+    SHARD_DATABASE_URLS = [url.strip() for url in os.getenv("SHARD_DATABASE_URLS", DATABASE_URL).split(",") if url.strip()]
+    SHARD_VIRTUAL_BUCKETS = 1024
+    # How often pods reload the bucket -> shard map from the directory
+    SHARD_MAP_REFRESH_SECONDS = float(os.getenv("SHARD_MAP_REFRESH_SECONDS", "5"))
+    TRANSFER_RECOVERY_SECONDS = float(os.getenv("TRANSFER_RECOVERY_SECONDS", "30"))
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    # Fast cold start: skip the schema DDL (applied by the first pod or a job)
+    # and pre-warm connections and validators before the pod reports ready
+    FAST_STARTUP = os.getenv("FAST_STARTUP", "false").lower() == "true"
+    # Tracing (OpenTelemetry) - opt-in
+    ENABLE_TRACING = os.getenv("ENABLE_TRACING", "false").lower() == "true"
+    OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "banking-backend")
+    OTEL_SAMPLING_RATIO = float(os.getenv("OTEL_SAMPLING_RATIO", "0.1"))
+    OTEL_EXPORTER = os.getenv("OTEL_EXPORTER", "file")  # file | otlp | console
+    OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "/app/logs/traces.jsonl")
+    # On-demand per-request profiling, guarded by a shared token
+    PROFILE_HEADER = "X-Debug-Profile"
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_TOP_STACKS = int(os.getenv("PROFILE_TOP_STACKS", "15"))
+    # Velocity limits: "<operation>:<method|service_type|*>" -> [[window_s, max_count, max_amount_cents], ...]
+    # "<operation>:*" applies to every operation of that kind; method rules add to it
+    VELOCITY_RULES = json.loads(os.getenv("VELOCITY_RULES", json.dumps({
+        "withdrawal:*": [[60, 5, 200000], [3600, 20, 500000], [86400, 50, 1000000]],
+        "withdrawal:atm": [[60, 3, 50000], [3600, 10, 100000], [86400, 20, 200000]],
+        "payment:*": [[60, 10, 500000], [3600, 50, 2000000], [86400, 200, 5000000]],
+        "transfer:*": [[60, 10, 500000], [3600, 30, 2000000], [86400, 100, 5000000]],
+    })))
+    VELOCITY_BUCKETS_PER_WINDOW = 60
+    VELOCITY_LOCAL_MAX_ACCOUNTS = int(os.getenv("VELOCITY_LOCAL_MAX_ACCOUNTS", "100000"))
+    # Scheduled payments: every replica runs workers that claim due payments
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+    SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+    SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "5"))
+    SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "5"))
+    SCHEDULER_RETRY_BASE_SECONDS = int(os.getenv("SCHEDULER_RETRY_BASE_SECONDS", "900"))
+    SCHEDULER_CLAIM_SECONDS = int(os.getenv("SCHEDULER_CLAIM_SECONDS", "300"))
 
 config = Config()
 
+# Tracing initialization
+def init_tracing():
+    """Export a span per request, asyncpg query and Redis command."""
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.asyncpg import AsyncPGInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": config.OTEL_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(config.OTEL_SAMPLING_RATIO)),
+    )
+
+    if config.OTEL_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=config.OTEL_EXPORTER_OTLP_ENDPOINT)
+    elif config.OTEL_EXPORTER == "file":
+        os.makedirs(os.path.dirname(config.OTEL_TRACES_FILE) or ".", exist_ok=True)
+        exporter = ConsoleSpanExporter(
+            out=open(config.OTEL_TRACES_FILE, "a"),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    else:
+        exporter = ConsoleSpanExporter()
+
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+    FastAPIInstrumentor.instrument_app(app, tracer_provider=provider)
+    AsyncPGInstrumentor().instrument(tracer_provider=provider)
+    RedisInstrumentor().instrument(tracer_provider=provider)
+    logger.info(
+        f"Tracing enabled: exporter={config.OTEL_EXPORTER} sampling_ratio={config.OTEL_SAMPLING_RATIO}"
+    )
+
+if config.ENABLE_TRACING:
+    init_tracing()
+
+# Per-request sampling profiler
+profile_logger = logging.getLogger("PROFILER")
+
+class StackSampler:
+    """Samples the event loop thread's stack and folds it into flame-graph lines.
+
+    The event loop is shared, so samples may include other requests running
+    concurrently; under light load the summary is dominated by this request.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def leaf_summary(self, top: int = 5) -> str:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return ", ".join(f"{leaf}={count}" for leaf, count in leaves.most_common(top))
+
+def profiling_requested(request: Request) -> bool:
+    token = request.headers.get(config.PROFILE_HEADER)
+    return bool(config.PROFILE_TOKEN and token and hmac.compare_digest(token, config.PROFILE_TOKEN))
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not profiling_requested(request):
+        return await call_next(request)
+
+    sampler = StackSampler(threading.get_ident(), config.PROFILE_INTERVAL_MS / 1000)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    profile_logger.info("=" * 70)
+    profile_logger.info(f"🔥 PERFIL DE PETICIÓN: {request.method} {request.url.path}")
+    profile_logger.info(f"   ⏱️ Duración: {elapsed_ms:.1f}ms - Muestras: {sampler.samples}")
+    for stack, count in sampler.stacks.most_common(config.PROFILE_TOP_STACKS):
+        profile_logger.info(f"   {count} {stack}")
+    profile_logger.info("=" * 70)
+
+    response.headers["X-Profile-Duration-Ms"] = f"{elapsed_ms:.1f}"
+    response.headers["X-Profile-Samples"] = str(sampler.samples)
+    response.headers["X-Profile-Summary"] = sampler.leaf_summary()
+    return response
+
 # Database and Redis connections
-db_pool = None
+db_pool = None  # directory database (users); account data goes through shard_router
 redis_client = None
 
+# Money
+class Money:
+    """An amount in integer minor units (cents) with its ISO 4217 currency.
+
+    Accepts numbers, numeric strings, Decimals or {"amount": ..., "currency": ...}
+    in major units and serializes to a JSON number with two decimals, the
+    format the frontend already reads.
+    """
+
+    __slots__ = ("cents", "currency")
+    MINOR_UNITS = 100
+    MAX_CENTS = 2 ** 63 - 1  # BIGINT
+    MAX_MAJOR_DIGITS = 17  # MAX_CENTS / 100 has 17 integer digits
+
+    def __init__(self, cents: int, currency: str = "USD"):
+        if abs(cents) > self.MAX_CENTS:
+            raise ValueError("amount out of range")
+        self.cents = cents
+        self.currency = currency
+
+    @classmethod
+    def parse(cls, value, currency: str = "USD") -> "Money":
+        if isinstance(value, Money):
+            return value
+        if isinstance(value, dict):
+            return cls.parse(value.get("amount"), value.get("currency", currency))
+        if not (isinstance(currency, str) and len(currency) == 3 and currency.isalpha() and currency.isupper()):
+            raise ValueError("currency must be a 3-letter ISO 4217 code")
+        if isinstance(value, bool):
+            raise ValueError("amount must be a number")
+        if isinstance(value, int):
+            return cls(value * cls.MINOR_UNITS, currency)
+        if isinstance(value, (str, float, Decimal)):
+            try:
+                amount = Decimal(str(value).strip())
+                if not amount.is_finite():
+                    raise ValueError("amount must be finite")
+                # Reject by magnitude before scaling: "1e999990" would otherwise
+                # build a million-digit integer before the range check
+                if amount and amount.adjusted() >= cls.MAX_MAJOR_DIGITS:
+                    raise ValueError("amount out of range")
+                cents = amount.scaleb(2)
+                if cents != cents.to_integral_value():
+                    raise ValueError("amount cannot have more than 2 decimal places")
+                return cls(int(cents), currency)
+            except ArithmeticError:
+                raise ValueError("amount must be a number")
+        raise ValueError("amount must be a number")
+
+    def to_number(self) -> float:
+        # cents / 100 is the closest double to the exact amount, so its repr
+        # is always the exact two-decimal value
+        return self.cents / self.MINOR_UNITS
+
+    def _check(self, other: "Money"):
+        if self.currency != other.currency:
+            raise ValueError(f"currency mismatch: {self.currency} != {other.currency}")
+
+    def __add__(self, other: "Money") -> "Money":
+        self._check(other)
+        return Money(self.cents + other.cents, self.currency)
+
+    def __sub__(self, other: "Money") -> "Money":
+        self._check(other)
+        return Money(self.cents - other.cents, self.currency)
+
+    def __neg__(self) -> "Money":
+        return Money(-self.cents, self.currency)
+
+    def __abs__(self) -> "Money":
+        return Money(abs(self.cents), self.currency)
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents == other.cents and self.currency == other.currency
+
+    def __lt__(self, other: "Money") -> bool:
+        self._check(other)
+        return self.cents < other.cents
+
+    def __le__(self, other: "Money") -> bool:
+        self._check(other)
+        return self.cents <= other.cents
+
+    def __gt__(self, other: "Money") -> bool:
+        self._check(other)
+        return self.cents > other.cents
+
+    def __ge__(self, other: "Money") -> bool:
+        self._check(other)
+        return self.cents >= other.cents
+
+    def __hash__(self):
+        return hash((self.cents, self.currency))
+
+    def __str__(self):
+        sign = "-" if self.cents < 0 else ""
+        major, minor = divmod(abs(self.cents), self.MINOR_UNITS)
+        return f"{sign}{major}.{minor:02d}"
+
+    def __format__(self, spec: str):
+        # Logs use "${amount:.2f}"; always render the exact two-decimal value
+        if spec.endswith("f"):
+            return str(self)
+        return format(str(self), spec)
+
+    def __repr__(self):
+        return f"Money('{self}', '{self.currency}')"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        return core_schema.no_info_plain_validator_function(
+            cls.parse,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda money: money.to_number(), when_used="json"
+            ),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        # Responses always carry a plain number; requests also accept decimal
+        # strings and {"amount": ..., "currency": ...}
+        if handler.mode == "serialization":
+            return {"type": "number"}
+        return {
+            "anyOf": [
+                {"type": "number"},
+                {"type": "string", "pattern": r"^-?\d+(\.\d{1,2})?$"},
+                {
+                    "type": "object",
+                    "properties": {
+                        "amount": {"anyOf": [{"type": "number"}, {"type": "string"}]},
+                        "currency": {"type": "string", "pattern": "^[A-Z]{3}$"},
+                    },
+                    "required": ["amount"],
+                },
+            ]
+        }
+
+def _positive(money: Money) -> Money:
+    if money.cents <= 0:
+        raise ValueError("amount must be greater than 0")
+    return money
+
+def _non_negative(money: Money) -> Money:
+    if money.cents < 0:
+        raise ValueError("amount must be greater than or equal to 0")
+    return money
+
+PositiveMoney = Annotated[Money, AfterValidator(_positive)]
+NonNegativeMoney = Annotated[Money, AfterValidator(_non_negative)]
+
 # Pydantic models
 class Account(BaseModel):
     id: Optional[str] = None
     account_number: str = Field(..., min_length=10, max_length=20)
     account_type: str = Field(..., pattern="^(checking|savings|investment)$")
-    balance: Decimal = Field(default=0.00, ge=0)
+    balance: NonNegativeMoney = Field(default_factory=lambda: Money(0))
+    currency: str = Field(default="USD", pattern="^[A-Z]{3}$")
     owner_id: str
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -79,7 +406,7 @@ class Transaction(BaseModel):
     id: Optional[str] = None
     from_account: str
     to_account: str
-    amount: Decimal = Field(..., gt=0)
+    amount: PositiveMoney
     transaction_type: str = Field(..., pattern="^(transfer|deposit|withdrawal)$")
     description: Optional[str] = Field(None, max_length=255)
     created_at: Optional[datetime] = None
@@ -100,27 +427,40 @@ class LoginRequest(BaseModel):
 class TransferRequest(BaseModel):
     from_account: str
     to_account: str
-    amount: Decimal = Field(..., gt=0)
-    description: Optional[str] = None
+    amount: PositiveMoney
+    description: Optional[str] = Field(None, max_length=255)
 
 class PayServiceRequest(BaseModel):
     account_id: str
     service_provider: str = Field(..., min_length=1, max_length=100)
     service_type: str = Field(..., pattern="^(electricity|water|gas|phone|internet|cable|insurance|credit_card|loan|other)$")
-    amount: Decimal = Field(..., gt=0)
+    amount: PositiveMoney
     reference_number: Optional[str] = Field(None, max_length=50)
     description: Optional[str] = Field(None, max_length=255)
 
+class ScheduledPaymentRequest(PayServiceRequest):
+    frequency: str = Field(..., pattern="^(once|daily|weekly|monthly)$")
+    start_at: datetime
+    end_at: Optional[datetime] = None
+
+    @field_validator("start_at", "end_at")
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]):
+        # Timestamps are stored as UTC without time zone, like created_at
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class DepositRequest(BaseModel):
     account_id: str
-    amount: Decimal = Field(..., gt=0)
+    amount: PositiveMoney
     deposit_method: str = Field(..., pattern="^(cash|check|transfer|atm|mobile)$")
     description: Optional[str] = Field(None, max_length=255)
     reference_number: Optional[str] = Field(None, max_length=50)
 
 class WithdrawRequest(BaseModel):
     account_id: str
-    amount: Decimal = Field(..., gt=0)
+    amount: PositiveMoney
     withdrawal_method: str = Field(..., pattern="^(cash|atm|transfer|check)$")
     description: Optional[str] = Field(None, max_length=255)
 
@@ -129,41 +469,327 @@ class ServicePayment(BaseModel):
     account_id: str
     service_provider: str
     service_type: str
-    amount: Decimal
+    amount: PositiveMoney
     reference_number: Optional[str] = None
     status: str = Field(default="pending", pattern="^(pending|completed|failed)$")
     created_at: Optional[datetime] = None
 
+# Token revocation
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class TokenRevocations:
+    """Revoked tokens, checked without a network hop on the common path.
+
+    Redis holds the source of truth: a sorted set of revoked jtis scored by
+    token expiry and a hash of per-user "revoked before" timestamps. Every
+    revocation is also appended to a stream that each pod follows to update
+    its local Bloom filter and per-user map. Only Bloom hits are confirmed
+    against Redis, so a false positive costs one lookup and never a 401.
+    """
+
+    REVOKED_JTIS = "revoked_jtis"
+    REVOKED_USERS = "revoked_users"
+    STREAM = "revocations"
+    STREAM_MAXLEN = 100000
+
+    def __init__(self, capacity: int, error_rate: float, rebuild_seconds: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.revoked_before = {}
+        self.last_id = "0-0"
+        self.loaded_at = 0.0
+
+    async def load(self, client):
+        """Rebuild local state from Redis, dropping tokens that already expired."""
+        # One MULTI/EXEC round trip: the stream position and the snapshot are
+        # consistent, so following from last_id misses nothing
+        now = time.time()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.xrevrange(self.STREAM, count=1)
+            pipe.zremrangebyscore(self.REVOKED_JTIS, "-inf", now)
+            pipe.zrangebyscore(self.REVOKED_JTIS, now, "+inf")
+            pipe.hgetall(self.REVOKED_USERS)
+            latest, _, jtis, users = await pipe.execute()
+        last_id = latest[0][0] if latest else "0-0"
+
+        bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+        for jti in jtis:
+            bloom.add(_decode(jti))
+        cutoff = now - config.JWT_EXPIRE_MINUTES * 60
+        stale = [user for user, before in users.items() if float(before) < cutoff]
+        if stale:
+            await client.hdel(self.REVOKED_USERS, *stale)
+
+        self.bloom = bloom
+        self.revoked_before = {_decode(user): float(before) for user, before in users.items() if user not in stale}
+        self.last_id = last_id
+        self.loaded_at = now
+        redis_logger.info(f"🔐 Revocaciones cargadas: {len(jtis)} tokens, {len(self.revoked_before)} usuarios")
+
+    def _apply(self, fields: dict):
+        fields = {_decode(key): _decode(value) for key, value in fields.items()}
+        if "jti" in fields:
+            self.bloom.add(fields["jti"])
+        if "user" in fields:
+            before = float(fields["before"])
+            self.revoked_before[fields["user"]] = max(before, self.revoked_before.get(fields["user"], 0))
+
+    async def revoke(self, client, jti: str, expires_at: float):
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.REVOKED_JTIS, {jti: expires_at})
+            pipe.xadd(self.STREAM, {"jti": jti}, maxlen=self.STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+        self.bloom.add(jti)
+
+    async def revoke_user(self, client, username: str, before: float):
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.REVOKED_USERS, username, before)
+            pipe.xadd(self.STREAM, {"user": username, "before": before}, maxlen=self.STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+        self._apply({"user": username, "before": before})
+
+    async def is_revoked(self, client, payload: dict) -> bool:
+        before = self.revoked_before.get(payload.get("sub"))
+        if before is not None and payload.get("iat", 0) < before:
+            return True
+        jti = payload.get("jti")
+        if jti is None or jti not in self.bloom:
+            return False
+        try:
+            return await client.zscore(self.REVOKED_JTIS, jti) is not None
+        except redis.RedisError as e:
+            # Can't confirm a likely revocation: fail closed
+            redis_logger.warning(f"⚠️ No se pudo confirmar la revocación de {jti}: {e}")
+            return True
+
+    async def follow(self, client):
+        """Apply revocations from other pods as they arrive."""
+        while True:
+            try:
+                if time.time() - self.loaded_at > self.rebuild_seconds:
+                    await self.load(client)
+                entries = await client.xread({self.STREAM: self.last_id}, count=1000, block=5000)
+                for _, messages in entries or []:
+                    for message_id, fields in messages:
+                        self._apply(fields)
+                        self.last_id = message_id
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                redis_logger.error(f"💥 ERROR SINCRONIZANDO REVOCACIONES: {e}")
+                await asyncio.sleep(1)
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+token_revocations = TokenRevocations(
+    config.REVOCATION_BLOOM_CAPACITY, config.REVOCATION_BLOOM_ERROR_RATE, config.REVOCATION_REBUILD_SECONDS
+)
+revocation_tasks = []
+
 # Authentication functions
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=config.JWT_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Millisecond iat (NumericDate may be fractional) so revoke-all only
+    # catches tokens issued before it, even within the same second
+    to_encode.update({"exp": expire, "iat": round(time.time(), 3), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, config.JWT_SECRET_KEY, algorithm=config.JWT_ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
         payload = jwt.decode(credentials.credentials, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
     except jwt.PyJWTError:
+        payload = None
+    if payload is None or payload.get("sub") is None or await token_revocations.is_revoked(redis_client, payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
+
+async def verify_token(payload: dict = Depends(token_payload)) -> str:
+    return payload["sub"]
+
+def account_from_row(row) -> Account:
+    return Account(
+        id=str(row['id']),
+        account_number=row['account_number'],
+        account_type=row['account_type'],
+        balance=Money(row['balance_cents'], row['currency']),
+        currency=row['currency'],
+        owner_id=str(row['owner_id']),
+        created_at=row['created_at'],
+        updated_at=row['updated_at'],
+    )
+
+# Account sharding
+class ShardRouter:
+    """Maps account ids to per-shard asyncpg pools.
+
+    Account ids hash into a fixed set of virtual buckets. The shard_buckets
+    table in the directory database assigns each bucket to a shard, and every
+    pod reloads it periodically. Rebalancing (rebalance_shards.py) moves one
+    bucket's accounts and history and then reassigns the bucket; no other
+    account changes shard. A bucket flagged as moving answers 503 until the
+    move finishes. New accounts must be created on shard_for(id).
+    """
+
+    def __init__(self, urls: List[str], virtual_buckets: int):
+        self.urls = urls
+        self.virtual_buckets = virtual_buckets
+        self.bucket_map = []
+        self.moving = set()
+        self.pools = []
+        self.watcher = None
+
+    async def connect(self, min_size: int, max_size: int):
+        self.pools = list(await asyncio.gather(*(
+            asyncpg.create_pool(url, min_size=min_size, max_size=max_size) for url in self.urls
+        )))
+
+    async def close(self):
+        if self.watcher:
+            self.watcher.cancel()
+            await asyncio.gather(self.watcher, return_exceptions=True)
+            self.watcher = None
+        await asyncio.gather(*(pool.close() for pool in self.pools))
+
+    @property
+    def directory(self):
+        return self.pools[0]
+
+    async def seed_bucket_map(self):
+        """Create the bucket map on first start.
+
+        A directory that already holds accounts comes from a single-database
+        deployment, so every bucket stays on shard 0 until rebalance_shards.py
+        moves them. A new deployment spreads the buckets over all shards.
+        """
+        if await self.directory.fetchval("SELECT EXISTS (SELECT 1 FROM shard_buckets)"):
+            return
+        existing = await self.directory.fetchval("SELECT EXISTS (SELECT 1 FROM accounts)")
+        await self.directory.execute('''
+            INSERT INTO shard_buckets (bucket, shard)
+            SELECT bucket, bucket % $2 FROM generate_series(0, $1 - 1) AS bucket
+            ON CONFLICT (bucket) DO NOTHING
+        ''', self.virtual_buckets, 1 if existing else len(self.pools))
+
+    async def load_bucket_map(self):
+        rows = await self.directory.fetch("SELECT bucket, shard, moving FROM shard_buckets ORDER BY bucket")
+        if [row['bucket'] for row in rows] != list(range(self.virtual_buckets)):
+            raise RuntimeError(f"shard_buckets must map buckets 0..{self.virtual_buckets - 1}")
+        shards = {row['shard'] for row in rows}
+        if max(shards) >= len(self.pools):
+            raise RuntimeError(f"shard_buckets references shard {max(shards)} but only {len(self.pools)} are configured")
+        self.bucket_map = [row['shard'] for row in rows]
+        self.moving = {row['bucket'] for row in rows if row['moving']}
+
+    async def watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load_bucket_map()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"💥 ERROR RECARGANDO MAPA DE SHARDS: {e}")
+
+    def start_watching(self, interval: float):
+        self.watcher = asyncio.create_task(self.watch(interval))
+
+    def bucket_for(self, account_id) -> int:
+        try:
+            key = uuid.UUID(str(account_id)).bytes
+        except ValueError:
+            key = str(account_id).encode()
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big") % self.virtual_buckets
+
+    def shard_for(self, account_id) -> int:
+        return self.bucket_map[self.bucket_for(account_id)]
+
+    def pool_for(self, account_id):
+        bucket = self.bucket_for(account_id)
+        if bucket in self.moving:
+            raise HTTPException(
+                status_code=503, detail="Cuenta en migración entre shards, reintente",
+                headers={"Retry-After": "5"},
+            )
+        return self.pools[self.bucket_map[bucket]]
+
+    async def gather(self, fn):
+        """Run fn(pool) on every shard concurrently (scatter-gather)."""
+        return await asyncio.gather(*(fn(pool) for pool in self.pools))
+
+shard_router = ShardRouter(config.SHARD_DATABASE_URLS, config.SHARD_VIRTUAL_BUCKETS)
+
+# Usernames never change, so their ids are cached per pod after the first
+# directory lookup
+user_ids = {}
+
+async def resolve_user_id(username: str):
+    user_id = user_ids.get(username)
+    if user_id is None:
+        user_id = await db_pool.fetchval("SELECT id FROM users WHERE username = $1", username)
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        if len(user_ids) > 100000:
+            user_ids.clear()
+        user_ids[username] = user_id
+    return user_id
+
+# Account owners never change, so a pod can keep the ones it has verified;
+# a conditional request that ends in a 304 then doesn't touch Postgres
+account_owners = {}
+
+async def ensure_account_owner(account_id: str, username: str):
+    """404 unless the account exists and belongs to the user (runs before any ETag check)."""
+    user_id = await resolve_user_id(username)
+    if account_owners.get(account_id) == user_id:
+        return user_id
+    owned = await shard_router.pool_for(account_id).fetchval(
+        "SELECT 1 FROM accounts WHERE id = $1 AND owner_id = $2", account_id, user_id
+    )
+    if not owned:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    if len(account_owners) > 100000:
+        account_owners.clear()
+    account_owners[account_id] = user_id
+    return user_id
 
 # Database initialization
 async def init_db():
     global db_pool
-    db_pool = await asyncpg.create_pool(config.DATABASE_URL)
+    await shard_router.connect(config.DB_POOL_MIN_SIZE, config.DB_POOL_MAX_SIZE)
+    db_pool = shard_router.directory
+    
+    if config.FAST_STARTUP:
+        await shard_router.load_bucket_map()
+        await warm_db_connections()
+        return
     
     # Create tables if they don't exist
     async with db_pool.acquire() as conn:
@@ -179,24 +805,46 @@ async def init_db():
             )
         ''')
         
+        # Bucket -> shard assignment, see ShardRouter
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS shard_buckets (
+                bucket INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL,
+                moving BOOLEAN NOT NULL DEFAULT FALSE,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+    await shard_router.gather(init_shard_schema)
+    await shard_router.seed_bucket_map()
+    await shard_router.load_bucket_map()
+
+async def init_shard_schema(pool):
+    async with pool.acquire() as conn:
+        # owner_id points to users in the directory database, so it can't be
+        # a foreign key on the shards
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS accounts (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 account_number VARCHAR(20) UNIQUE NOT NULL,
                 account_type VARCHAR(20) NOT NULL CHECK (account_type IN ('checking', 'savings', 'investment')),
-                balance DECIMAL(15,2) DEFAULT 0.00 CHECK (balance >= 0),
-                owner_id UUID NOT NULL REFERENCES users(id),
+                balance_cents BIGINT NOT NULL DEFAULT 0 CHECK (balance_cents >= 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
+                owner_id UUID NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_accounts_owner ON accounts (owner_id)")
+        
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS transactions (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 from_account UUID REFERENCES accounts(id),
                 to_account UUID REFERENCES accounts(id),
-                amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
                 transaction_type VARCHAR(20) NOT NULL CHECK (transaction_type IN ('transfer', 'deposit', 'withdrawal')),
                 description TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -204,25 +852,70 @@ async def init_db():
             )
         ''')
         
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS payment_schedules (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                account_id UUID NOT NULL REFERENCES accounts(id),
+                service_provider VARCHAR(100) NOT NULL,
+                service_type VARCHAR(20) NOT NULL CHECK (service_type IN ('electricity', 'water', 'gas', 'phone', 'internet', 'cable', 'insurance', 'credit_card', 'loan', 'other')),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
+                reference_number VARCHAR(50),
+                description TEXT,
+                frequency VARCHAR(10) NOT NULL CHECK (frequency IN ('once', 'daily', 'weekly', 'monthly')),
+                start_at TIMESTAMP NOT NULL,
+                end_at TIMESTAMP,
+                next_run_at TIMESTAMP NOT NULL,
+                occurrence INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                status VARCHAR(20) NOT NULL DEFAULT 'active' CHECK (status IN ('active', 'completed', 'failed', 'cancelled')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Due-time index: workers only ever scan active schedules by next_run_at
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_payment_schedules_due
+            ON payment_schedules (next_run_at) WHERE status = 'active'
+        ''')
+        
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS service_payments (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 account_id UUID NOT NULL REFERENCES accounts(id),
                 service_provider VARCHAR(100) NOT NULL,
                 service_type VARCHAR(20) NOT NULL CHECK (service_type IN ('electricity', 'water', 'gas', 'phone', 'internet', 'cable', 'insurance', 'credit_card', 'loan', 'other')),
-                amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
                 reference_number VARCHAR(50),
                 description TEXT,
                 status VARCHAR(20) DEFAULT 'pending' CHECK (status IN ('pending', 'completed', 'failed')),
+                schedule_id UUID REFERENCES payment_schedules(id),
+                scheduled_for TIMESTAMP,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        await conn.execute('''
+            ALTER TABLE service_payments
+            ADD COLUMN IF NOT EXISTS schedule_id UUID REFERENCES payment_schedules(id),
+            ADD COLUMN IF NOT EXISTS scheduled_for TIMESTAMP
+        ''')
+        
+        # A scheduled occurrence can only ever be paid once
+        await conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_service_payments_schedule_occurrence
+            ON service_payments (schedule_id, scheduled_for) WHERE schedule_id IS NOT NULL
+        ''')
+        
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS deposits (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 account_id UUID NOT NULL REFERENCES accounts(id),
-                amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
                 deposit_method VARCHAR(20) NOT NULL CHECK (deposit_method IN ('cash', 'check', 'transfer', 'atm', 'mobile')),
                 reference_number VARCHAR(50),
                 description TEXT,
@@ -235,31 +928,369 @@ async def init_db():
             CREATE TABLE IF NOT EXISTS withdrawals (
                 id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 account_id UUID NOT NULL REFERENCES accounts(id),
-                amount DECIMAL(15,2) NOT NULL CHECK (amount > 0),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
                 withdrawal_method VARCHAR(20) NOT NULL CHECK (withdrawal_method IN ('cash', 'atm', 'transfer', 'check')),
                 description TEXT,
                 status VARCHAR(20) DEFAULT 'completed' CHECK (status IN ('pending', 'completed', 'failed')),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        
+        # Transfers live on the source account's shard; to_account may be on another one
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS transfers (
+                id UUID PRIMARY KEY,
+                from_account UUID NOT NULL REFERENCES accounts(id),
+                to_account UUID NOT NULL,
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
+                description TEXT,
+                status VARCHAR(20) NOT NULL CHECK (status IN ('debited', 'completed', 'compensated')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transfers_in_flight
+            ON transfers (updated_at) WHERE status = 'debited'
+        ''')
+        
+        # Credits live on the destination shard; the primary key makes crediting idempotent
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS transfer_credits (
+                transfer_id UUID PRIMARY KEY,
+                from_account UUID NOT NULL,
+                to_account UUID NOT NULL REFERENCES accounts(id),
+                amount_cents BIGINT NOT NULL CHECK (amount_cents > 0),
+                currency CHAR(3) NOT NULL DEFAULT 'USD',
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
 
 # Redis initialization
 async def init_redis():
+    """Connect to Redis and load what the first requests need from it.
+
+    from_url is lazy; the revocation load is what opens the connection, so
+    all of this runs concurrently with init_db at startup.
+    """
     global redis_client
     redis_client = redis.from_url(config.REDIS_URL)
+    velocity_limiter.register(redis_client)
+    await token_revocations.load(redis_client)
+    if config.FAST_STARTUP:
+        await redis_client.script_load(VELOCITY_LUA)
+
+# Velocity limits
+# Each window is a Redis hash of fixed-size buckets ("c:<bucket>" counts and
+# "a:<bucket>" amounts in cents). The script sums the live buckets, drops the
+# expired ones and records the operation only if every window stays within
+# its limits, so a check is a single round trip with O(buckets) work.
+VELOCITY_LUA = """
+local now = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+local buckets = {}
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 4
+    local window = tonumber(ARGV[base + 1])
+    local size = tonumber(ARGV[base + 2])
+    local max_count = tonumber(ARGV[base + 3])
+    local max_amount = tonumber(ARGV[base + 4])
+    local current = math.floor(now / size)
+    local oldest = current - math.floor(window / size) + 1
+    local count, total = 0, 0
+    local fields = redis.call('HGETALL', key)
+    for j = 1, #fields, 2 do
+        local bucket = tonumber(string.sub(fields[j], 3))
+        if bucket < oldest then
+            redis.call('HDEL', key, fields[j])
+        elseif string.sub(fields[j], 1, 1) == 'c' then
+            count = count + tonumber(fields[j + 1])
+        else
+            total = total + tonumber(fields[j + 1])
+        end
+    end
+    if count + 1 > max_count or total + amount > max_amount then
+        return i
+    end
+    buckets[i] = current
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HINCRBY', key, 'c:' .. buckets[i], 1)
+    redis.call('HINCRBY', key, 'a:' .. buckets[i], amount)
+    redis.call('EXPIRE', key, tonumber(ARGV[2 + (i - 1) * 4 + 1]))
+end
+return 0
+"""
+
+class VelocityLimiter:
+    """Per-account count/amount limits over sliding windows.
+
+    A per-pod copy of the counters acts as a pre-filter: this pod's counts are
+    a lower bound of the global ones, so a local violation is rejected without
+    a Redis round trip.
+    """
+
+    def __init__(self, rules: dict, buckets_per_window: int, max_local_accounts: int):
+        self.rules = rules
+        self.buckets_per_window = buckets_per_window
+        self.max_local_accounts = max_local_accounts
+        self._local = {}
+        self._script = None
+
+    def register(self, client):
+        self._script = client.register_script(VELOCITY_LUA)
+
+    def limits_for(self, operation: str, method: str):
+        """(scope, window, max_count, max_amount) for every applicable rule.
+
+        The "<operation>:*" rules always apply; a method-specific rule adds
+        tighter limits on top, so e.g. ATM withdrawals also count towards the
+        account's overall withdrawal cap.
+        """
+        scopes = [f"{operation}:*"]
+        if method != "*":
+            scopes.append(f"{operation}:{method}")
+        return [
+            (scope, window, max_count, max_amount)
+            for scope in scopes
+            for window, max_count, max_amount in self.rules.get(scope, [])
+        ]
+
+    def _bucket_size(self, window: int) -> int:
+        return max(1, window // self.buckets_per_window)
+
+    def _local_violation(self, account_id: str, limits, now: int, amount: int):
+        buckets = self._local.get(account_id)
+        if not buckets:
+            return None
+        for index, (scope, window, max_count, max_amount) in enumerate(limits):
+            size = self._bucket_size(window)
+            oldest = now // size - window // size + 1
+            count = total = 0
+            for (bucket_scope, bucket_window, bucket), (c, a) in buckets.items():
+                if bucket_scope == scope and bucket_window == window and bucket >= oldest:
+                    count += c
+                    total += a
+            if count + 1 > max_count or total + amount > max_amount:
+                return index
+        return None
+
+    def _local_add(self, account_id: str, limits, now: int, amount: int):
+        buckets = self._local.pop(account_id, None) or {}
+        for scope, window, _, _ in limits:
+            size = self._bucket_size(window)
+            oldest = now // size - window // size + 1
+            for stale in [b for b in buckets if b[0] == scope and b[1] == window and b[2] < oldest]:
+                del buckets[stale]
+            counters = buckets.setdefault((scope, window, now // size), [0, 0])
+            counters[0] += 1
+            counters[1] += amount
+        # Re-insert to keep the dict ordered by last use and evict the oldest account
+        self._local[account_id] = buckets
+        if len(self._local) > self.max_local_accounts:
+            del self._local[next(iter(self._local))]
+
+    def _reject(self, account_id: str, scope: str, window: int):
+        redis_logger.warning(f"🚫 LÍMITE DE VELOCIDAD EXCEDIDO: cuenta={account_id} regla={scope} ventana={window}s")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Límite de operaciones excedido ({scope}, ventana de {window}s)",
+            headers={"Retry-After": str(self._bucket_size(window))},
+        )
+
+    async def check(self, account_id: str, operation: str, method: str, amount_cents: int):
+        """Record the operation or raise 429 if any window would be exceeded."""
+        limits = self.limits_for(operation, method)
+        if not limits:
+            return None
+        now = int(time.time())
+
+        violated = self._local_violation(account_id, limits, now, amount_cents)
+        if violated is not None:
+            self._reject(account_id, limits[violated][0], limits[violated][1])
+
+        if self._script is not None:
+            args = [now, amount_cents]
+            for _, window, max_count, max_amount in limits:
+                args += [window, self._bucket_size(window), max_count, max_amount]
+            try:
+                violated = await self._script(
+                    keys=[f"velocity:{account_id}:{scope}:{window}" for scope, window, _, _ in limits], args=args
+                )
+            except redis.RedisError as e:
+                redis_logger.warning(f"⚠️ Límites de velocidad sin Redis, usando contadores locales: {e}")
+                violated = 0
+            if violated:
+                self._reject(account_id, limits[violated - 1][0], limits[violated - 1][1])
+
+        self._local_add(account_id, limits, now, amount_cents)
+        return (account_id, limits, now, amount_cents)
+
+    async def release(self, reservation):
+        """Undo a recorded operation that did not go through."""
+        if reservation is None:
+            return
+        account_id, limits, now, amount_cents = reservation
+        buckets = self._local.get(account_id, {})
+        for scope, window, _, _ in limits:
+            counters = buckets.get((scope, window, now // self._bucket_size(window)))
+            if counters:
+                counters[0] -= 1
+                counters[1] -= amount_cents
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for scope, window, _, _ in limits:
+                    bucket = now // self._bucket_size(window)
+                    pipe.hincrby(f"velocity:{account_id}:{scope}:{window}", f"c:{bucket}", -1)
+                    pipe.hincrby(f"velocity:{account_id}:{scope}:{window}", f"a:{bucket}", -amount_cents)
+                await pipe.execute()
+        except redis.RedisError as e:
+            redis_logger.warning(f"⚠️ No se pudo liberar el límite de velocidad: {e}")
+
+velocity_limiter = VelocityLimiter(
+    config.VELOCITY_RULES, config.VELOCITY_BUCKETS_PER_WINDOW, config.VELOCITY_LOCAL_MAX_ACCOUNTS
+)
+
+# Per-account version counters for ETags
+# Counters start at a millisecond epoch (instead of 0) so that versions keep
+# increasing if Redis loses them and stale ETags can never match again.
+def _version_keys(account_ids=(), owner_id=None):
+    keys = [f"account_version:{account_id}" for account_id in account_ids]
+    if owner_id:
+        keys.append(f"user_accounts_version:{owner_id}")
+    return keys
+
+# Version keys whose bump failed. Their stored version may still match what
+# clients hold, so this pod serves them without an ETag until the keys are
+# deleted (and so re-seeded from a newer epoch) by invalidate_versions.
+stale_versions = set()
+version_tasks = set()
+
+async def invalidate_versions(keys):
+    attempt = 0
+    while True:
+        try:
+            await redis_client.delete(*keys)
+            stale_versions.difference_update(keys)
+            redis_logger.info(f"🔄 Versiones invalidadas tras fallo: {keys}")
+            return
+        except redis.RedisError as e:
+            attempt += 1
+            redis_logger.warning(f"⚠️ Reintento {attempt} invalidando {keys}: {e}")
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+async def bump_versions(account_ids=(), owner_id=None):
+    """Invalidate the ETags of the given accounts (and of the owner's account list)."""
+    keys = _version_keys(account_ids, owner_id)
+    if redis_client is None or not keys:
+        return
+    epoch = int(time.time() * 1000)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.set(key, epoch, nx=True)
+                pipe.incr(key)
+            await pipe.execute()
+    except redis.RedisError as e:
+        redis_logger.warning(f"⚠️ No se pudo actualizar la versión de {keys}: {e}")
+        stale_versions.update(keys)
+        task = asyncio.create_task(invalidate_versions(keys))
+        version_tasks.add(task)
+        task.add_done_callback(version_tasks.discard)
+
+async def current_etag(scope: str, account_ids=(), owner_id=None, extra: str = ""):
+    """Build an ETag from the current versions, or None if Redis is unavailable."""
+    keys = _version_keys(account_ids, owner_id)
+    if stale_versions.intersection(keys):
+        return None
+    try:
+        versions = await redis_client.mget(keys)
+        if any(version is None for version in versions):
+            epoch = int(time.time() * 1000)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(key, epoch, nx=True)
+                await pipe.execute()
+            versions = await redis_client.mget(keys)
+    except (redis.RedisError, AttributeError) as e:
+        redis_logger.warning(f"⚠️ ETag no disponible para {scope}: {e}")
+        return None
+    tag = "-".join([scope, *(v.decode() if isinstance(v, bytes) else str(v) for v in versions)])
+    if extra:
+        tag = f"{tag}-{extra}"
+    return f'"{tag}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+def set_etag(response: Response, etag: Optional[str]):
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+
+# Pre-warm connections and validators so the first requests don't pay for them
+async def warm_db_connections():
+    async def warm_db_connection(pool):
+        async with pool.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+    
+    # create_pool already opened min_size connections; touch them so they
+    # are past authentication and ready to serve
+    await asyncio.gather(*(
+        warm_db_connection(pool) for pool in shard_router.pools for _ in range(config.DB_POOL_MIN_SIZE)
+    ))
+
+def prewarm():
+    """Run the request models' validators once so the first requests don't build them."""
+    account_id = str(uuid.uuid4())
+    DepositRequest.model_validate({"account_id": account_id, "amount": "1.00", "deposit_method": "cash"})
+    WithdrawRequest.model_validate({"account_id": account_id, "amount": "1.00", "withdrawal_method": "atm"})
+    PayServiceRequest.model_validate({
+        "account_id": account_id, "service_provider": "warmup", "service_type": "other", "amount": "1.00"
+    })
+    LoginRequest.model_validate({"username": "warmup", "password": "warmup"})
+    Account(account_number="0000000000", account_type="checking", owner_id=account_id).model_dump_json()
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
-    await init_redis()
-    logger.info("Banking API started successfully")
+    started = time.perf_counter()
+    # Postgres (pools, schema or warm-up) and Redis (connection, Lua script,
+    # revocation list) don't depend on each other
+    await asyncio.gather(init_db(), init_redis())
+    if config.FAST_STARTUP:
+        prewarm()
+    if config.SCHEDULER_ENABLED:
+        start_scheduler()
+    start_transfer_recovery()
+    shard_router.start_watching(config.SHARD_MAP_REFRESH_SECONDS)
+    revocation_tasks.append(asyncio.create_task(token_revocations.follow(redis_client)))
+    logger.info(f"Banking API started successfully in {(time.perf_counter() - started) * 1000:.0f}ms")
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    if db_pool:
-        await db_pool.close()
+    await stop_scheduler()
+    await stop_transfer_recovery()
+    background = [*revocation_tasks, *version_tasks]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    if shard_router.pools:
+        await shard_router.close()
     if redis_client:
         await redis_client.close()
     logger.info("Banking API shutdown completed")
@@ -277,9 +1308,8 @@ async def ping():
 @app.get("/health", tags=["Health"])
 async def health_check():
     try:
-        # Check database connection
-        async with db_pool.acquire() as conn:
-            await conn.fetchval("SELECT 1")
+        # Check database connections (directory and every shard)
+        await shard_router.gather(lambda pool: pool.fetchval("SELECT 1"))
         
         # Check Redis connection
         await redis_client.ping()
@@ -288,6 +1318,7 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "database": "connected",
+            "shards": len(shard_router.pools),
             "cache": "connected"
         }
     except Exception as e:
@@ -333,6 +1364,25 @@ async def login(login_request: LoginRequest):
             "expires_in": config.JWT_EXPIRE_MINUTES * 60
         }
 
+@app.post("/api/auth/logout", tags=["Authentication"])
+async def logout(payload: dict = Depends(token_payload)):
+    """Revoke the token used for this request"""
+    if payload.get("jti"):
+        await token_revocations.revoke(redis_client, payload["jti"], payload["exp"])
+    await redis_client.delete(f"session:{payload['sub']}")
+    logger.info(f"🔐 Sesión cerrada: {payload['sub']}")
+    return {"status": "logged_out"}
+
+@app.post("/api/auth/revoke-all", tags=["Authentication"])
+async def revoke_all_sessions(username: str = Depends(verify_token)):
+    """Revoke every token issued to the current user so far"""
+    # Tokens with an earlier iat are revoked; tokens issued from now on are not
+    revoked_before = round(time.time(), 3)
+    await token_revocations.revoke_user(redis_client, username, revoked_before)
+    await redis_client.delete(f"session:{username}")
+    logger.info(f"🔐 Todas las sesiones revocadas: {username}")
+    return {"status": "revoked", "revoked_before": datetime.utcfromtimestamp(revoked_before).isoformat()}
+
 # User endpoints
 @app.get("/api/users/me", response_model=User, tags=["Users"])
 async def get_current_user(current_user: str = Depends(verify_token)):
@@ -349,20 +1399,23 @@ async def get_current_user(current_user: str = Depends(verify_token)):
 
 # Account endpoints
 @app.get("/api/accounts", response_model=List[Account], tags=["Accounts"])
-async def get_user_accounts(current_user: str = Depends(verify_token)):
-    async with db_pool.acquire() as conn:
-        # Get user ID
-        user = await conn.fetchrow("SELECT id FROM users WHERE username = $1", current_user)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get user accounts
-        accounts = await conn.fetch(
-            "SELECT id, account_number, account_type, balance, owner_id, created_at, updated_at FROM accounts WHERE owner_id = $1",
-            user['id']
-        )
-        
-        return [Account(**dict(account)) for account in accounts]
+async def get_user_accounts(request: Request, response: Response, current_user: str = Depends(verify_token)):
+    # Get user ID
+    user_id = await resolve_user_id(current_user)
+    
+    etag = await current_etag("accounts", owner_id=user_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    # Get user accounts from every shard
+    shard_accounts = await shard_router.gather(lambda pool: pool.fetch(
+        "SELECT id, account_number, account_type, balance_cents, currency, owner_id, created_at, updated_at FROM accounts WHERE owner_id = $1",
+        user_id
+    ))
+    
+    accounts = sorted((account for rows in shard_accounts for account in rows), key=lambda account: account['created_at'] or datetime.min)
+    return [account_from_row(account) for account in accounts]
 
 # Logging específico para transacciones
 transaction_logger = logging.getLogger("TRANSACTIONS")
@@ -387,7 +1440,11 @@ async def create_transaction(transaction_data: dict, request: Request):
     
     try:
         # Extraer y validar datos
-        amount = float(transaction_data.get("amount", 0))
+        try:
+            amount = Money.parse(transaction_data.get("amount", 0))
+        except ValueError as e:
+            transaction_logger.error(f"❌ VALIDACIÓN FALLIDA: Monto inválido ({e})")
+            raise HTTPException(status_code=400, detail=f"Monto inválido: {e}")
         transaction_type = transaction_data.get("type", "unknown")
         description = transaction_data.get("description", "Sin descripción")
         account_id = transaction_data.get("account_id", "default_account")
@@ -404,7 +1461,7 @@ async def create_transaction(transaction_data: dict, request: Request):
         # Log de validaciones
         transaction_logger.info("🔍 VALIDANDO TRANSACCIÓN...")
         
-        if amount <= 0:
+        if amount.cents <= 0:
             transaction_logger.error(f"❌ VALIDACIÓN FALLIDA: Monto inválido (${amount})")
             raise HTTPException(status_code=400, detail="Monto debe ser mayor a 0")
             
@@ -419,7 +1476,7 @@ async def create_transaction(transaction_data: dict, request: Request):
         db_logger.info(f"   📊 Query: SELECT balance FROM accounts WHERE id = '{account_id}'")
         
         # Simular balance actual (en producción sería una consulta real)
-        current_balance = 1500.00
+        current_balance = Money(150000)
         db_logger.info(f"   💳 Balance actual encontrado: ${current_balance:.2f}")
         
         # Validar fondos suficientes para retiros/transferencias
@@ -461,18 +1518,19 @@ async def create_transaction(transaction_data: dict, request: Request):
         transaction_logger.info(f"   💰 Monto procesado: ${amount:.2f}")
         transaction_logger.info(f"   💳 Balance anterior: ${current_balance:.2f}")
         transaction_logger.info(f"   💳 Balance nuevo: ${new_balance:.2f}")
-        transaction_logger.info(f"   ⏱️ Tiempo de procesamiento: ~{50 + (amount * 0.1):.0f}ms")
+        transaction_logger.info(f"   ⏱️ Tiempo de procesamiento: ~{50 + amount.cents / 1000:.0f}ms")
         transaction_logger.info("=" * 80)
         
         return {
             "status": "success",
             "transaction_id": transaction_id,
-            "amount": amount,
+            "amount": amount.to_number(),
+            "currency": amount.currency,
             "type": transaction_type,
             "description": description,
             "account_id": account_id,
-            "previous_balance": current_balance,
-            "new_balance": new_balance,
+            "previous_balance": current_balance.to_number(),
+            "new_balance": new_balance.to_number(),
             "timestamp": timestamp,
             "message": f"Transacción {transaction_type} por ${amount:.2f} procesada exitosamente"
         }
@@ -497,7 +1555,15 @@ async def create_transaction(transaction_data: dict, request: Request):
         )
 
 @app.get("/api/balance/{account_id}", tags=["Accounts"])
-async def get_balance(account_id: str, request: Request):
+async def get_balance(account_id: uuid.UUID, request: Request, response: Response, username: str = Depends(verify_token)):
+    # Canonical form, so cache and ETag keys don't depend on how the client wrote it
+    account_id = str(account_id)
+    user_id = await ensure_account_owner(account_id, username)
+    etag = await current_etag("balance", [account_id])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     client_ip = request.client.host
     timestamp = datetime.utcnow().isoformat()
     
@@ -508,45 +1574,42 @@ async def get_balance(account_id: str, request: Request):
     db_logger.info(f"   ⏰ Timestamp: {timestamp}")
     
     try:
-        # Intentar obtener de Redis primero
-        redis_logger.info("🔴 VERIFICANDO CACHE DE REDIS...")
-        redis_logger.info(f"   🔍 GET balance:{account_id}")
+        # Consultar PostgreSQL en el shard de la cuenta
+        shard = shard_router.shard_for(account_id)
+        db_logger.info(f"🗄️ CONSULTANDO POSTGRESQL (shard {shard})...")
+        db_logger.info(f"   📊 Query: SELECT balance_cents, currency, account_type, updated_at FROM accounts WHERE id = '{account_id}' AND owner_id = '{user_id}'")
         
-        # Simular cache miss
-        redis_logger.info("❌ CACHE MISS - Balance no encontrado en Redis")
+        account = await shard_router.pools[shard].fetchrow(
+            "SELECT balance_cents, currency, account_type, updated_at FROM accounts WHERE id = $1 AND owner_id = $2",
+            account_id, user_id
+        )
         
-        # Consultar PostgreSQL
-        db_logger.info("🗄️ CONSULTANDO POSTGRESQL...")
-        db_logger.info(f"   📊 Query: SELECT balance, account_type, updated_at FROM accounts WHERE id = '{account_id}'")
+        if not account:
+            raise HTTPException(status_code=404, detail="Cuenta no encontrada")
         
-        # Simular datos de cuenta
-        balance = 1500.00
-        account_type = "checking"
-        last_updated = timestamp
+        balance = Money(account['balance_cents'], account['currency'])
+        account_type = account['account_type']
+        last_updated = account['updated_at'].isoformat() if account['updated_at'] else None
         
         db_logger.info(f"   ✅ Cuenta encontrada:")
         db_logger.info(f"   💳 Balance: ${balance:.2f}")
         db_logger.info(f"   📝 Tipo: {account_type}")
         db_logger.info(f"   🕒 Última actualización: {last_updated}")
         
-        # Guardar en cache
-        redis_logger.info("💾 GUARDANDO EN CACHE...")
-        redis_logger.info(f"   🔑 SET balance:{account_id} = {balance}")
-        redis_logger.info(f"   ⏱️ EXPIRE balance:{account_id} 300")
-        redis_logger.info("✅ BALANCE GUARDADO EN CACHE")
-        
         db_logger.info("🎯 CONSULTA DE BALANCE COMPLETADA")
         db_logger.info("=" * 60)
         
         return {
             "account_id": account_id,
-            "balance": balance,
+            "balance": balance.to_number(),
             "account_type": account_type,
-            "currency": "USD",
+            "currency": balance.currency,
             "last_updated": last_updated,
             "source": "database"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         db_logger.error("💥 ERROR EN CONSULTA DE BALANCE")
         db_logger.error(f"   🐛 Error: {str(e)}")
@@ -558,8 +1621,36 @@ async def get_balance(account_id: str, request: Request):
             detail=f"Error consultando balance: {str(e)}"
         )
 
+# Debits are negative, credits positive
+ACCOUNT_HISTORY_QUERY = '''
+    SELECT id, amount_cents, currency, 'deposit' AS type, description, created_at, status
+    FROM deposits WHERE account_id = $1
+    UNION ALL
+    SELECT id, -amount_cents, currency, 'withdrawal', description, created_at, status
+    FROM withdrawals WHERE account_id = $1
+    UNION ALL
+    SELECT id, -amount_cents, currency, 'service_payment', COALESCE(description, service_provider), created_at, status
+    FROM service_payments WHERE account_id = $1
+    UNION ALL
+    SELECT id, -amount_cents, currency, 'transfer', description, created_at, status
+    FROM transfers WHERE from_account = $1
+    UNION ALL
+    SELECT transfer_id, amount_cents, currency, 'transfer', description, created_at, 'completed'
+    FROM transfer_credits WHERE to_account = $1
+    ORDER BY created_at DESC
+    LIMIT $2
+'''
+
 @app.get("/api/transactions/{account_id}", tags=["Transactions"])
-async def get_transactions_history(account_id: str, limit: int = 10, request: Request = None):
+async def get_transactions_history(account_id: uuid.UUID, response: Response, limit: int = Query(10, ge=1, le=100),
+                                   request: Request = None, username: str = Depends(verify_token)):
+    account_id = str(account_id)
+    await ensure_account_owner(account_id, username)
+    etag = await current_etag("history", [account_id], extra=str(limit))
+    if request and etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     client_ip = request.client.host if request else "unknown"
     
     db_logger.info("=" * 70)
@@ -569,28 +1660,22 @@ async def get_transactions_history(account_id: str, limit: int = 10, request: Re
     db_logger.info(f"   🌐 IP Cliente: {client_ip}")
     
     try:
-        # Simular consulta a base de datos
-        db_logger.info("🗄️ EJECUTANDO CONSULTA EN POSTGRESQL...")
-        db_logger.info(f"   📊 Query: SELECT * FROM transactions WHERE account_id = '{account_id}' ORDER BY created_at DESC LIMIT {limit}")
+        # Todo el historial de una cuenta vive en su shard
+        shard = shard_router.shard_for(account_id)
+        db_logger.info(f"🗄️ EJECUTANDO CONSULTA EN POSTGRESQL (shard {shard})...")
+        db_logger.info(f"   📊 Query: deposits/withdrawals/service_payments/transfers WHERE account_id = '{account_id}' ORDER BY created_at DESC LIMIT {limit}")
         
-        # Datos simulados de transacciones
+        rows = await shard_router.pools[shard].fetch(ACCOUNT_HISTORY_QUERY, account_id, limit)
         transactions = [
             {
-                "id": "TXN-ABC123456789",
-                "amount": 500.00,
-                "type": "deposit",
-                "description": "Salary deposit",
-                "created_at": "2024-10-20T10:30:00Z",
-                "status": "completed"
-            },
-            {
-                "id": "TXN-DEF987654321",
-                "amount": -50.00,
-                "type": "withdrawal",
-                "description": "ATM withdrawal",
-                "created_at": "2024-10-19T15:45:00Z",
-                "status": "completed"
+                "id": str(row['id']),
+                "amount": Money(row['amount_cents'], row['currency']),
+                "type": row['type'],
+                "description": row['description'],
+                "created_at": row['created_at'].isoformat() if row['created_at'] else None,
+                "status": row['status']
             }
+            for row in rows
         ]
         
         db_logger.info(f"   ✅ Encontradas {len(transactions)} transacciones")
@@ -607,7 +1692,10 @@ async def get_transactions_history(account_id: str, limit: int = 10, request: Re
         
         return {
             "account_id": account_id,
-            "transactions": transactions,
+            "transactions": [
+                {**txn, "amount": txn["amount"].to_number(), "currency": txn["amount"].currency}
+                for txn in transactions
+            ],
             "total_found": len(transactions),
             "limit": limit
         }
@@ -622,11 +1710,58 @@ async def get_transactions_history(account_id: str, limit: int = 10, request: Re
             detail=f"Error obteniendo historial: {str(e)}"
         )
 
+# Service payments
+class InsufficientFundsError(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Saldo insuficiente")
+
+async def execute_service_payment(conn, payment: PayServiceRequest, schedule_id=None, scheduled_for=None):
+    """Debit the account and record the payment; shared by pay_service and the scheduler.
+
+    `conn` must belong to the account's shard. Returns (payment_id, new_balance, owner_id).
+    """
+    async with conn.transaction():
+        account = await conn.fetchrow(
+            "SELECT id, balance_cents, currency FROM accounts WHERE id = $1",
+            payment.account_id
+        )
+        
+        if not account:
+            raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+        
+        if account['currency'] != payment.amount.currency:
+            raise HTTPException(status_code=400, detail="Moneda no coincide con la cuenta")
+        
+        # Update account balance; the condition makes the funds check atomic
+        updated = await conn.fetchrow(
+            "UPDATE accounts SET balance_cents = balance_cents - $1 "
+            "WHERE id = $2 AND balance_cents >= $1 "
+            "RETURNING balance_cents, owner_id",
+            payment.amount.cents, payment.account_id
+        )
+        
+        if not updated:
+            raise InsufficientFundsError()
+        
+        # Create service payment record
+        payment_id = await conn.fetchval('''
+            INSERT INTO service_payments 
+            (account_id, service_provider, service_type, amount_cents, currency, reference_number, description,
+             status, schedule_id, scheduled_for)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, 'completed', $8, $9)
+            RETURNING id
+        ''', payment.account_id, payment.service_provider, payment.service_type, 
+            payment.amount.cents, payment.amount.currency, payment.reference_number, payment.description,
+            schedule_id, scheduled_for)
+    
+    return payment_id, Money(updated['balance_cents'], account['currency']), updated['owner_id']
+
 # Service Payment Endpoint
 @app.post("/api/pay-service", tags=["Services"])
 async def pay_service(payment: PayServiceRequest, username: str = Depends(verify_token)):
     """Pay for services like electricity, water, gas, etc."""
     db_logger = logging.getLogger("database.service_payment")
+    reservation = None
     
     try:
         db_logger.info("💳 INICIANDO PAGO DE SERVICIO")
@@ -636,51 +1771,34 @@ async def pay_service(payment: PayServiceRequest, username: str = Depends(verify
         db_logger.info(f"   🔧 Tipo: {payment.service_type}")
         db_logger.info(f"   💰 Monto: ${payment.amount:.2f}")
         
-        async with db_pool.acquire() as conn:
-            # Verify account exists and has sufficient balance
-            account = await conn.fetchrow(
-                "SELECT id, balance FROM accounts WHERE id = $1",
-                payment.account_id
-            )
-            
-            if not account:
-                raise HTTPException(status_code=404, detail="Cuenta no encontrada")
-            
-            if account['balance'] < payment.amount:
-                raise HTTPException(status_code=400, detail="Saldo insuficiente")
-            
-            # Create service payment record
-            payment_id = await conn.fetchval('''
-                INSERT INTO service_payments 
-                (account_id, service_provider, service_type, amount, reference_number, description, status)
-                VALUES ($1, $2, $3, $4, $5, $6, 'completed')
-                RETURNING id
-            ''', payment.account_id, payment.service_provider, payment.service_type, 
-                payment.amount, payment.reference_number, payment.description)
-            
-            # Update account balance
-            new_balance = await conn.fetchval(
-                "UPDATE accounts SET balance = balance - $1 WHERE id = $2 RETURNING balance",
-                payment.amount, payment.account_id
-            )
-            
-            db_logger.info(f"   ✅ Pago procesado exitosamente")
-            db_logger.info(f"   🆔 ID Pago: {payment_id}")
-            db_logger.info(f"   💰 Nuevo saldo: ${new_balance:.2f}")
-            db_logger.info("=" * 70)
-            
-            return {
-                "payment_id": str(payment_id),
-                "status": "completed",
-                "service_provider": payment.service_provider,
-                "amount": payment.amount,
-                "new_balance": new_balance,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        reservation = await velocity_limiter.check(
+            payment.account_id, "payment", payment.service_type, payment.amount.cents
+        )
+        
+        async with shard_router.pool_for(payment.account_id).acquire() as conn:
+            payment_id, new_balance, owner = await execute_service_payment(conn, payment)
+        await bump_versions([payment.account_id], owner)
+        
+        db_logger.info(f"   ✅ Pago procesado exitosamente")
+        db_logger.info(f"   🆔 ID Pago: {payment_id}")
+        db_logger.info(f"   💰 Nuevo saldo: ${new_balance:.2f}")
+        db_logger.info("=" * 70)
+        
+        return {
+            "payment_id": str(payment_id),
+            "status": "completed",
+            "service_provider": payment.service_provider,
+            "amount": payment.amount.to_number(),
+            "currency": payment.amount.currency,
+            "new_balance": new_balance.to_number(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
             
     except HTTPException:
+        await velocity_limiter.release(reservation)
         raise
     except Exception as e:
+        await velocity_limiter.release(reservation)
         db_logger.error(f"💥 ERROR EN PAGO DE SERVICIO: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error procesando pago: {str(e)}")
 
@@ -698,30 +1816,35 @@ async def deposit_money(deposit: DepositRequest, username: str = Depends(verify_
         db_logger.info(f"   💰 Monto: ${deposit.amount:.2f}")
         db_logger.info(f"   📱 Método: {deposit.deposit_method}")
         
-        async with db_pool.acquire() as conn:
+        async with shard_router.pool_for(deposit.account_id).acquire() as conn:
             # Verify account exists
             account = await conn.fetchrow(
-                "SELECT id, balance FROM accounts WHERE id = $1",
+                "SELECT id, balance_cents, currency FROM accounts WHERE id = $1",
                 deposit.account_id
             )
             
             if not account:
                 raise HTTPException(status_code=404, detail="Cuenta no encontrada")
             
+            if account['currency'] != deposit.amount.currency:
+                raise HTTPException(status_code=400, detail="Moneda no coincide con la cuenta")
+            
             # Create deposit record
             deposit_id = await conn.fetchval('''
                 INSERT INTO deposits 
-                (account_id, amount, deposit_method, reference_number, description, status)
-                VALUES ($1, $2, $3, $4, $5, 'completed')
+                (account_id, amount_cents, currency, deposit_method, reference_number, description, status)
+                VALUES ($1, $2, $3, $4, $5, $6, 'completed')
                 RETURNING id
-            ''', deposit.account_id, deposit.amount, deposit.deposit_method, 
+            ''', deposit.account_id, deposit.amount.cents, deposit.amount.currency, deposit.deposit_method, 
                 deposit.reference_number, deposit.description)
             
             # Update account balance
-            new_balance = await conn.fetchval(
-                "UPDATE accounts SET balance = balance + $1 WHERE id = $2 RETURNING balance",
-                deposit.amount, deposit.account_id
+            updated = await conn.fetchrow(
+                "UPDATE accounts SET balance_cents = balance_cents + $1 WHERE id = $2 RETURNING balance_cents, owner_id",
+                deposit.amount.cents, deposit.account_id
             )
+            new_balance = Money(updated['balance_cents'], account['currency'])
+            await bump_versions([deposit.account_id], updated['owner_id'])
             
             db_logger.info(f"   ✅ Depósito procesado exitosamente")
             db_logger.info(f"   🆔 ID Depósito: {deposit_id}")
@@ -731,9 +1854,10 @@ async def deposit_money(deposit: DepositRequest, username: str = Depends(verify_
             return {
                 "deposit_id": str(deposit_id),
                 "status": "completed",
-                "amount": deposit.amount,
+                "amount": deposit.amount.to_number(),
+                "currency": deposit.amount.currency,
                 "method": deposit.deposit_method,
-                "new_balance": new_balance,
+                "new_balance": new_balance.to_number(),
                 "timestamp": datetime.utcnow().isoformat()
             }
             
@@ -748,6 +1872,7 @@ async def deposit_money(deposit: DepositRequest, username: str = Depends(verify_
 async def withdraw_money(withdrawal: WithdrawRequest, username: str = Depends(verify_token)):
     """Withdraw money from an account"""
     db_logger = logging.getLogger("database.withdrawal")
+    reservation = None
     
     try:
         db_logger.info("💸 INICIANDO RETIRO")
@@ -757,53 +1882,545 @@ async def withdraw_money(withdrawal: WithdrawRequest, username: str = Depends(ve
         db_logger.info(f"   💰 Monto: ${withdrawal.amount:.2f}")
         db_logger.info(f"   🏧 Método: {withdrawal.withdrawal_method}")
         
-        async with db_pool.acquire() as conn:
-            # Verify account exists and has sufficient balance
-            account = await conn.fetchrow(
-                "SELECT id, balance FROM accounts WHERE id = $1",
-                withdrawal.account_id
-            )
-            
-            if not account:
-                raise HTTPException(status_code=404, detail="Cuenta no encontrada")
-            
-            if account['balance'] < withdrawal.amount:
-                raise HTTPException(status_code=400, detail="Saldo insuficiente")
-            
-            # Create withdrawal record
-            withdrawal_id = await conn.fetchval('''
-                INSERT INTO withdrawals 
-                (account_id, amount, withdrawal_method, description, status)
-                VALUES ($1, $2, $3, $4, 'completed')
-                RETURNING id
-            ''', withdrawal.account_id, withdrawal.amount, withdrawal.withdrawal_method, withdrawal.description)
-            
-            # Update account balance
-            new_balance = await conn.fetchval(
-                "UPDATE accounts SET balance = balance - $1 WHERE id = $2 RETURNING balance",
-                withdrawal.amount, withdrawal.account_id
-            )
-            
-            db_logger.info(f"   ✅ Retiro procesado exitosamente")
-            db_logger.info(f"   🆔 ID Retiro: {withdrawal_id}")
-            db_logger.info(f"   💰 Nuevo saldo: ${new_balance:.2f}")
-            db_logger.info("=" * 70)
-            
-            return {
-                "withdrawal_id": str(withdrawal_id),
-                "status": "completed",
-                "amount": withdrawal.amount,
-                "method": withdrawal.withdrawal_method,
-                "new_balance": new_balance,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        reservation = await velocity_limiter.check(
+            withdrawal.account_id, "withdrawal", withdrawal.withdrawal_method, withdrawal.amount.cents
+        )
+        
+        async with shard_router.pool_for(withdrawal.account_id).acquire() as conn:
+            async with conn.transaction():
+                # Verify account exists
+                account = await conn.fetchrow(
+                    "SELECT id, balance_cents, currency FROM accounts WHERE id = $1",
+                    withdrawal.account_id
+                )
+                
+                if not account:
+                    raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+                
+                if account['currency'] != withdrawal.amount.currency:
+                    raise HTTPException(status_code=400, detail="Moneda no coincide con la cuenta")
+                
+                # Update account balance; the condition makes the funds check atomic
+                updated = await conn.fetchrow(
+                    "UPDATE accounts SET balance_cents = balance_cents - $1 "
+                    "WHERE id = $2 AND balance_cents >= $1 "
+                    "RETURNING balance_cents, owner_id",
+                    withdrawal.amount.cents, withdrawal.account_id
+                )
+                
+                if not updated:
+                    raise InsufficientFundsError()
+                
+                # Create withdrawal record
+                withdrawal_id = await conn.fetchval('''
+                    INSERT INTO withdrawals 
+                    (account_id, amount_cents, currency, withdrawal_method, description, status)
+                    VALUES ($1, $2, $3, $4, $5, 'completed')
+                    RETURNING id
+                ''', withdrawal.account_id, withdrawal.amount.cents, withdrawal.amount.currency,
+                    withdrawal.withdrawal_method, withdrawal.description)
+        
+        new_balance = Money(updated['balance_cents'], account['currency'])
+        await bump_versions([withdrawal.account_id], updated['owner_id'])
+        
+        db_logger.info(f"   ✅ Retiro procesado exitosamente")
+        db_logger.info(f"   🆔 ID Retiro: {withdrawal_id}")
+        db_logger.info(f"   💰 Nuevo saldo: ${new_balance:.2f}")
+        db_logger.info("=" * 70)
+        
+        return {
+            "withdrawal_id": str(withdrawal_id),
+            "status": "completed",
+            "amount": withdrawal.amount.to_number(),
+            "currency": withdrawal.amount.currency,
+            "method": withdrawal.withdrawal_method,
+            "new_balance": new_balance.to_number(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
             
     except HTTPException:
+        await velocity_limiter.release(reservation)
         raise
     except Exception as e:
+        await velocity_limiter.release(reservation)
         db_logger.error(f"💥 ERROR EN RETIRO: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error procesando retiro: {str(e)}")
 
+# Scheduled and recurring service payments
+# Every replica runs SCHEDULER_WORKERS loops. Each loop claims a batch of due
+# schedules with FOR UPDATE SKIP LOCKED and a short lease on next_run_at, so
+# replicas never pick the same row and throughput grows with the replica
+# count. Each schedule then runs in its own transaction: the payment goes
+# through execute_service_payment and the schedule advances in the same
+# transaction. A crash therefore rolls both back together, and the unique
+# (schedule_id, scheduled_for) index guarantees an occurrence is paid once.
+scheduler_logger = logging.getLogger("SCHEDULER")
+scheduler_tasks = []
+SCHEDULE_START_TOLERANCE = timedelta(minutes=5)
+
+def occurrence_at(start_at: datetime, frequency: str, occurrence: int) -> datetime:
+    """Due time of the n-th occurrence, always computed from start_at so monthly
+    schedules on the 31st come back to the 31st after shorter months."""
+    if frequency == "daily":
+        return start_at + timedelta(days=occurrence)
+    if frequency == "weekly":
+        return start_at + timedelta(weeks=occurrence)
+    if frequency == "monthly":
+        month_index = start_at.month - 1 + occurrence
+        year, month = start_at.year + month_index // 12, month_index % 12 + 1
+        day = min(start_at.day, calendar.monthrange(year, month)[1])
+        return start_at.replace(year=year, month=month, day=day)
+    return start_at
+
+def first_occurrence(start_at: datetime, frequency: str, now: datetime) -> int:
+    """Index of the first occurrence due at or after now, so a schedule that
+    starts in the past doesn't pay every missed occurrence back to back."""
+    if start_at >= now or frequency == "once":
+        return 0
+    if frequency == "daily":
+        occurrence = (now - start_at).days
+    elif frequency == "weekly":
+        occurrence = (now - start_at).days // 7
+    else:
+        occurrence = (now.year - start_at.year) * 12 + now.month - start_at.month - 1
+    occurrence = max(occurrence, 0)
+    while occurrence_at(start_at, frequency, occurrence) < now:
+        occurrence += 1
+    return occurrence
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(config.SCHEDULER_RETRY_BASE_SECONDS * 2 ** (attempts - 1), 86400))
+
+async def run_schedule(conn, schedule, now: datetime):
+    """Execute one claimed schedule and advance it. Returns (account_id, owner) if paid."""
+    scheduled_for = occurrence_at(schedule['start_at'], schedule['frequency'], schedule['occurrence'])
+    payment = PayServiceRequest(
+        account_id=str(schedule['account_id']),
+        service_provider=schedule['service_provider'],
+        service_type=schedule['service_type'],
+        amount=Money(schedule['amount_cents'], schedule['currency']),
+        reference_number=schedule['reference_number'],
+        description=schedule['description'],
+    )
+    
+    paid, retryable, error, owner = False, False, None, None
+    try:
+        payment_id, new_balance, owner = await execute_service_payment(conn, payment, schedule['id'], scheduled_for)
+        paid = True
+        scheduler_logger.info(f"   ✅ Pago programado {schedule['id']} ejecutado: {payment_id} (${payment.amount:.2f})")
+    except asyncpg.UniqueViolationError:
+        # Already paid by an earlier run that failed to advance the schedule
+        paid = True
+    except InsufficientFundsError as e:
+        retryable, error = True, e.detail
+    except HTTPException as e:
+        error = e.detail
+    except Exception as e:
+        retryable, error = True, str(e)
+    
+    attempts = 0 if paid else schedule['attempts'] + 1
+    if not paid and retryable and attempts < config.SCHEDULER_MAX_ATTEMPTS:
+        occurrence, next_run_at, status_ = schedule['occurrence'], now + retry_delay(attempts), "active"
+        scheduler_logger.warning(f"   🔁 Pago programado {schedule['id']} reintento {attempts} a las {next_run_at}: {error}")
+    else:
+        # Paid, or this occurrence is given up; move on to the next one
+        occurrence = schedule['occurrence'] + 1
+        next_run_at = occurrence_at(schedule['start_at'], schedule['frequency'], occurrence)
+        finished = schedule['frequency'] == "once" or (schedule['end_at'] and next_run_at > schedule['end_at'])
+        status_ = ("completed" if paid else "failed") if finished else "active"
+        attempts = 0
+        if not paid:
+            scheduler_logger.error(f"   ❌ Pago programado {schedule['id']} abandonado para {scheduled_for}: {error}")
+    
+    await conn.execute('''
+        UPDATE payment_schedules
+        SET occurrence = $2, next_run_at = $3, attempts = $4, status = $5, last_error = $6, updated_at = CURRENT_TIMESTAMP
+        WHERE id = $1
+    ''', schedule['id'], occurrence, next_run_at, attempts, status_, error)
+    return (payment.account_id, owner) if paid and owner else None
+
+async def run_due_payments(pool) -> int:
+    """Claim and execute one batch of due schedules on a shard. Returns how many were claimed."""
+    now = datetime.utcnow()
+    # Claim the batch in one short statement by pushing next_run_at out to a
+    # lease; other workers skip the claimed rows. A schedule left behind by a
+    # crashed worker is claimed again once the lease expires, and the unique
+    # (schedule_id, scheduled_for) index keeps it from being paid twice.
+    lease = now + timedelta(seconds=config.SCHEDULER_CLAIM_SECONDS)
+    due = await pool.fetch('''
+        UPDATE payment_schedules SET next_run_at = $2
+        WHERE id IN (
+            SELECT id FROM payment_schedules
+            WHERE status = 'active' AND next_run_at <= $1
+            ORDER BY next_run_at
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    ''', now, lease, config.SCHEDULER_BATCH_SIZE)
+    
+    # One transaction per schedule: row locks are held for a single payment,
+    # not the whole batch
+    paid = []
+    async with pool.acquire() as conn:
+        for claimed in due:
+            async with conn.transaction():
+                # Skip schedules cancelled, or claimed again, since the batch was claimed
+                schedule = await conn.fetchrow(
+                    "SELECT * FROM payment_schedules WHERE id = $1 AND status = 'active' AND next_run_at = $2 FOR UPDATE",
+                    claimed['id'], lease
+                )
+                if schedule:
+                    paid.append(await run_schedule(conn, schedule, now))
+    
+    for account_id, owner in filter(None, paid):
+        await bump_versions([account_id], owner)
+    if due:
+        scheduler_logger.info(f"⏰ Lote de pagos programados: {len(due)} procesados, {len(list(filter(None, paid)))} pagados")
+    return len(due)
+
+async def scheduler_worker(worker_id: int):
+    while True:
+        try:
+            # Schedules live on their account's shard; drain one batch per shard
+            claimed = max([await run_due_payments(pool) for pool in shard_router.pools])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            scheduler_logger.error(f"💥 ERROR EN WORKER DE PAGOS PROGRAMADOS {worker_id}: {e}")
+            claimed = 0
+        # A full batch means there is a backlog: keep draining without sleeping.
+        # Jitter keeps replicas from polling in lockstep.
+        if claimed < config.SCHEDULER_BATCH_SIZE:
+            await asyncio.sleep(config.SCHEDULER_POLL_SECONDS * (0.5 + random.random()))
+
+def start_scheduler():
+    for worker_id in range(config.SCHEDULER_WORKERS):
+        scheduler_tasks.append(asyncio.create_task(scheduler_worker(worker_id)))
+    scheduler_logger.info(f"⏰ Scheduler iniciado con {config.SCHEDULER_WORKERS} workers")
+
+async def stop_scheduler():
+    for task in scheduler_tasks:
+        task.cancel()
+    await asyncio.gather(*scheduler_tasks, return_exceptions=True)
+    scheduler_tasks.clear()
+
+def schedule_to_dict(schedule) -> dict:
+    return {
+        "schedule_id": str(schedule['id']),
+        "account_id": str(schedule['account_id']),
+        "service_provider": schedule['service_provider'],
+        "service_type": schedule['service_type'],
+        "amount": Money(schedule['amount_cents'], schedule['currency']).to_number(),
+        "currency": schedule['currency'],
+        "frequency": schedule['frequency'],
+        "start_at": schedule['start_at'].isoformat(),
+        "end_at": schedule['end_at'].isoformat() if schedule['end_at'] else None,
+        "next_run_at": schedule['next_run_at'].isoformat(),
+        "status": schedule['status'],
+        "last_error": schedule['last_error'],
+    }
+
+@app.post("/api/scheduled-payments", tags=["Services"])
+async def create_scheduled_payment(schedule: ScheduledPaymentRequest, username: str = Depends(verify_token)):
+    """Schedule a one-off or recurring service payment"""
+    if schedule.end_at and schedule.end_at < schedule.start_at:
+        raise HTTPException(status_code=400, detail="end_at debe ser posterior a start_at")
+    
+    # Allow for clock skew on "start now"; anything older starts at the next occurrence
+    now = datetime.utcnow()
+    if schedule.frequency == "once" and schedule.start_at < now - SCHEDULE_START_TOLERANCE:
+        raise HTTPException(status_code=400, detail="start_at no puede estar en el pasado")
+    occurrence = first_occurrence(schedule.start_at, schedule.frequency, now - SCHEDULE_START_TOLERANCE)
+    next_run_at = occurrence_at(schedule.start_at, schedule.frequency, occurrence)
+    if schedule.end_at and next_run_at > schedule.end_at:
+        raise HTTPException(status_code=400, detail="El pago programado no tiene ocurrencias futuras")
+    
+    user_id = await resolve_user_id(username)
+    async with shard_router.pool_for(schedule.account_id).acquire() as conn:
+        account = await conn.fetchrow(
+            "SELECT currency FROM accounts WHERE id = $1 AND owner_id = $2",
+            schedule.account_id, user_id
+        )
+        if not account:
+            raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+        if account['currency'] != schedule.amount.currency:
+            raise HTTPException(status_code=400, detail="Moneda no coincide con la cuenta")
+        
+        created = await conn.fetchrow('''
+            INSERT INTO payment_schedules
+            (account_id, service_provider, service_type, amount_cents, currency, reference_number, description,
+             frequency, start_at, end_at, occurrence, next_run_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
+            RETURNING *
+        ''', schedule.account_id, schedule.service_provider, schedule.service_type, schedule.amount.cents,
+            schedule.amount.currency, schedule.reference_number, schedule.description, schedule.frequency,
+            schedule.start_at, schedule.end_at, occurrence, next_run_at)
+    
+    scheduler_logger.info(f"📅 Pago programado creado: {created['id']} ({schedule.frequency}) por {username}")
+    return schedule_to_dict(created)
+
+@app.get("/api/scheduled-payments", tags=["Services"])
+async def list_scheduled_payments(username: str = Depends(verify_token)):
+    user_id = await resolve_user_id(username)
+    shard_schedules = await shard_router.gather(lambda pool: pool.fetch('''
+        SELECT s.* FROM payment_schedules s
+        JOIN accounts a ON a.id = s.account_id
+        WHERE a.owner_id = $1
+    ''', user_id))
+    schedules = sorted((schedule for rows in shard_schedules for schedule in rows), key=lambda schedule: schedule['next_run_at'])
+    return [schedule_to_dict(schedule) for schedule in schedules]
+
+@app.delete("/api/scheduled-payments/{schedule_id}", tags=["Services"])
+async def cancel_scheduled_payment(schedule_id: uuid.UUID, username: str = Depends(verify_token)):
+    user_id = await resolve_user_id(username)
+    # The schedule id doesn't say which shard holds it; at most one shard matches
+    results = await shard_router.gather(lambda pool: pool.fetchrow('''
+        UPDATE payment_schedules s SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+        FROM accounts a
+        WHERE s.id = $1 AND s.status = 'active' AND a.id = s.account_id AND a.owner_id = $2
+        RETURNING s.*
+    ''', schedule_id, user_id))
+    cancelled = next((row for row in results if row), None)
+    if not cancelled:
+        raise HTTPException(status_code=404, detail="Pago programado no encontrado")
+    return schedule_to_dict(cancelled)
+
+# Transfers
+# Same-shard transfers are a single transaction. Cross-shard transfers are a
+# saga: (1) debit the source and record the transfer as 'debited' on the
+# source shard, (2) credit the destination on its shard, recording a
+# transfer_credits row whose primary key makes the step idempotent, then
+# (3) mark the transfer 'completed'. If the destination rejects the credit,
+# the source is refunded and the transfer marked 'compensated'. Transfers
+# left 'debited' by a crash or a network error are finished by the recovery
+# loop on every replica.
+transfer_logger = logging.getLogger("TRANSFERS")
+transfer_tasks = []
+
+class TransferRejected(Exception):
+    """The destination can never accept the credit (missing account, other currency)."""
+
+async def debit_transfer(conn, transfer_id, transfer: TransferRequest, owner_id, status_: str):
+    account = await conn.fetchrow(
+        "SELECT currency FROM accounts WHERE id = $1 AND owner_id = $2",
+        transfer.from_account, owner_id
+    )
+    if not account:
+        raise HTTPException(status_code=404, detail="Cuenta de origen no encontrada")
+    if account['currency'] != transfer.amount.currency:
+        raise HTTPException(status_code=400, detail="Moneda no coincide con la cuenta")
+    
+    debited = await conn.fetchrow(
+        "UPDATE accounts SET balance_cents = balance_cents - $1 WHERE id = $2 AND balance_cents >= $1 "
+        "RETURNING balance_cents",
+        transfer.amount.cents, transfer.from_account
+    )
+    if not debited:
+        raise InsufficientFundsError()
+    
+    await conn.execute('''
+        INSERT INTO transfers (id, from_account, to_account, amount_cents, currency, description, status)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ''', transfer_id, transfer.from_account, transfer.to_account, transfer.amount.cents,
+        transfer.amount.currency, transfer.description, status_)
+    return Money(debited['balance_cents'], account['currency'])
+
+async def credit_transfer(conn, transfer_id, from_account, to_account, amount: Money, description):
+    """Credit the destination once per transfer. Returns its owner_id, or None if already credited."""
+    inserted = await conn.fetchval('''
+        INSERT INTO transfer_credits (transfer_id, from_account, to_account, amount_cents, currency, description)
+        SELECT $1, $2, $3, $4, $5, $6 WHERE EXISTS (SELECT 1 FROM accounts WHERE id = $3)
+        ON CONFLICT (transfer_id) DO NOTHING
+        RETURNING transfer_id
+    ''', transfer_id, from_account, to_account, amount.cents, amount.currency, description)
+    if not inserted:
+        if await conn.fetchval("SELECT 1 FROM transfer_credits WHERE transfer_id = $1", transfer_id):
+            return None
+        raise TransferRejected("Cuenta de destino no encontrada")
+    
+    credited = await conn.fetchrow(
+        "UPDATE accounts SET balance_cents = balance_cents + $1 WHERE id = $2 AND currency = $3 RETURNING owner_id",
+        amount.cents, to_account, amount.currency
+    )
+    if not credited:
+        raise TransferRejected("Moneda no coincide con la cuenta de destino")
+    return credited['owner_id']
+
+async def credit_on_shard(transfer_id, from_account, to_account, amount: Money, description):
+    async with shard_router.pool_for(to_account).acquire() as conn:
+        async with conn.transaction():
+            return await credit_transfer(conn, transfer_id, from_account, to_account, amount, description)
+
+async def settle_transfer(conn, transfer_id, from_account, amount: Money, completed: bool):
+    """Step 3 or compensation on the source shard.
+
+    Returns (settled, source_owner): settled is False if another worker already
+    settled it; source_owner is set when the source was refunded.
+    """
+    settled = await conn.fetchval(
+        "UPDATE transfers SET status = $2, updated_at = CURRENT_TIMESTAMP WHERE id = $1 AND status = 'debited' RETURNING id",
+        transfer_id, "completed" if completed else "compensated"
+    )
+    source_owner = None
+    if settled and not completed:
+        source_owner = await conn.fetchval(
+            "UPDATE accounts SET balance_cents = balance_cents + $1 WHERE id = $2 RETURNING owner_id",
+            amount.cents, from_account
+        )
+    return bool(settled), source_owner
+
+@app.post("/api/transfers", tags=["Transactions"])
+async def transfer_money(transfer: TransferRequest, username: str = Depends(verify_token)):
+    """Transfer money between accounts, possibly on different shards"""
+    if transfer.from_account == transfer.to_account:
+        raise HTTPException(status_code=400, detail="Las cuentas de origen y destino deben ser distintas")
+    
+    owner_id = await resolve_user_id(username)
+    transfer_id = uuid.uuid4()
+    source_pool = shard_router.pool_for(transfer.from_account)
+    destination_pool = shard_router.pool_for(transfer.to_account)
+    
+    transfer_logger.info("=" * 70)
+    transfer_logger.info("🔁 INICIANDO TRANSFERENCIA")
+    transfer_logger.info(f"   🆔 ID: {transfer_id}")
+    transfer_logger.info(f"   🏦 {transfer.from_account} (shard {shard_router.shard_for(transfer.from_account)}) → "
+                         f"{transfer.to_account} (shard {shard_router.shard_for(transfer.to_account)})")
+    transfer_logger.info(f"   💰 Monto: ${transfer.amount:.2f}")
+    
+    reservation = await velocity_limiter.check(transfer.from_account, "transfer", "*", transfer.amount.cents)
+    debited = False
+    try:
+        if source_pool is destination_pool:
+            async with source_pool.acquire() as conn:
+                async with conn.transaction():
+                    new_balance = await debit_transfer(conn, transfer_id, transfer, owner_id, "completed")
+                    try:
+                        destination_owner = await credit_transfer(
+                            conn, transfer_id, transfer.from_account, transfer.to_account,
+                            transfer.amount, transfer.description
+                        )
+                    except TransferRejected as e:
+                        raise HTTPException(status_code=400, detail=str(e))
+            debited = True
+            status_ = "completed"
+        else:
+            async with source_pool.acquire() as conn:
+                async with conn.transaction():
+                    new_balance = await debit_transfer(conn, transfer_id, transfer, owner_id, "debited")
+            debited = True
+            
+            try:
+                destination_owner = await credit_on_shard(
+                    transfer_id, transfer.from_account, transfer.to_account, transfer.amount, transfer.description
+                )
+                completed = True
+            except TransferRejected as e:
+                async with source_pool.acquire() as conn:
+                    async with conn.transaction():
+                        await settle_transfer(conn, transfer_id, transfer.from_account, transfer.amount, False)
+                await bump_versions([transfer.from_account], owner_id)
+                transfer_logger.warning(f"   ↩️ Transferencia compensada: {e}")
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                # Debited but the credit outcome is unknown; recovery finishes it
+                transfer_logger.error(f"   ⏳ Transferencia pendiente de recuperación: {e}")
+                await bump_versions([transfer.from_account], owner_id)
+                return {
+                    "transfer_id": str(transfer_id),
+                    "status": "pending",
+                    "amount": transfer.amount.to_number(),
+                    "currency": transfer.amount.currency,
+                    "new_balance": new_balance.to_number(),
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            
+            async with source_pool.acquire() as conn:
+                await settle_transfer(conn, transfer_id, transfer.from_account, transfer.amount, completed)
+            status_ = "completed"
+    except HTTPException:
+        # Nothing debited, or the debit was compensated
+        await velocity_limiter.release(reservation)
+        raise
+    except Exception as e:
+        # Once debited the transfer goes through (recovery finishes it) and keeps counting
+        if not debited:
+            await velocity_limiter.release(reservation)
+        transfer_logger.error(f"💥 ERROR EN TRANSFERENCIA: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error procesando transferencia: {str(e)}")
+    
+    await bump_versions([transfer.from_account], owner_id)
+    await bump_versions([transfer.to_account], destination_owner)
+    transfer_logger.info(f"   ✅ Transferencia completada - Nuevo saldo: ${new_balance:.2f}")
+    transfer_logger.info("=" * 70)
+    
+    return {
+        "transfer_id": str(transfer_id),
+        "status": status_,
+        "amount": transfer.amount.to_number(),
+        "currency": transfer.amount.currency,
+        "new_balance": new_balance.to_number(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+async def recover_transfers(pool) -> int:
+    """Finish cross-shard transfers stuck in 'debited' on one source shard."""
+    # ETags are bumped only after the commit, so a concurrent GET can't pair
+    # the new version with the old balance
+    bumps = []
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            stuck = await conn.fetch('''
+                SELECT * FROM transfers
+                WHERE status = 'debited' AND updated_at < $1
+                ORDER BY updated_at
+                LIMIT 100
+                FOR UPDATE SKIP LOCKED
+            ''', datetime.utcnow() - timedelta(seconds=config.TRANSFER_RECOVERY_SECONDS))
+            for transfer in stuck:
+                amount = Money(transfer['amount_cents'], transfer['currency'])
+                try:
+                    destination_owner = await credit_on_shard(
+                        transfer['id'], transfer['from_account'], transfer['to_account'], amount, transfer['description']
+                    )
+                    completed = True
+                except TransferRejected as e:
+                    transfer_logger.warning(f"↩️ Transferencia {transfer['id']} compensada en recuperación: {e}")
+                    destination_owner, completed = None, False
+                except Exception as e:
+                    transfer_logger.error(f"⏳ Transferencia {transfer['id']} sigue pendiente: {e}")
+                    continue
+                settled, source_owner = await settle_transfer(
+                    conn, transfer['id'], transfer['from_account'], amount, completed
+                )
+                if settled:
+                    bumps.append(([str(transfer['from_account'])], source_owner))
+                if destination_owner:
+                    bumps.append(([str(transfer['to_account'])], destination_owner))
+    
+    for account_ids, owner in bumps:
+        await bump_versions(account_ids, owner)
+    return len(stuck)
+
+async def transfer_recovery_worker():
+    while True:
+        try:
+            await shard_router.gather(recover_transfers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            transfer_logger.error(f"💥 ERROR EN RECUPERACIÓN DE TRANSFERENCIAS: {e}")
+        await asyncio.sleep(config.TRANSFER_RECOVERY_SECONDS * (0.5 + random.random()))
+
+def start_transfer_recovery():
+    transfer_tasks.append(asyncio.create_task(transfer_recovery_worker()))
+
+async def stop_transfer_recovery():
+    for task in transfer_tasks:
+        task.cancel()
+    await asyncio.gather(*transfer_tasks, return_exceptions=True)
+    transfer_tasks.clear()
+
 # Root endpoint
 @app.get("/", tags=["Root"])
 async def root():
@@ -818,7 +2435,11 @@ async def root():
             "get_history": "GET /api/transactions/{account_id}",
             "pay_service": "POST /api/pay-service",
             "deposit": "POST /api/deposit",
-            "withdraw": "POST /api/withdraw"
+            "withdraw": "POST /api/withdraw",
+            "scheduled_payments": "POST/GET /api/scheduled-payments",
+            "transfer": "POST /api/transfers",
+            "logout": "POST /api/auth/logout",
+            "revoke_all": "POST /api/auth/revoke-all"
         }
     }
 
@@ -0,0 +1,143 @@
+# Banking API Backend - shard rebalancing
+#
+# Account ids hash into SHARD_VIRTUAL_BUCKETS buckets and the shard_buckets
+# table in the directory database (first SHARD_DATABASE_URLS entry) says which
+# shard owns each bucket. This tool moves whole buckets, with their accounts
+# and history, until every shard owns the same number of buckets:
+#
+#   python rebalance_shards.py --dry-run
+#   python rebalance_shards.py --max-buckets 64
+#   python rebalance_shards.py --bucket 17 --to 2
+#
+# Run it after adding a URL to SHARD_DATABASE_URLS (and restarting the pods),
+# or after switching an existing single-database deployment to several shards.
+#
+# Each move: the buckets are flagged as moving and the tool waits until every
+# pod has reloaded the map, so the API answers 503 for their accounts. Then,
+# per bucket, the schedules and accounts are locked on the source shard, all
+# rows are copied to the target shard in one transaction and deleted from the
+# source, and the bucket is pointed at the target. Buckets with a cross-shard
+# transfer still in flight are skipped until the next run. The script is
+# idempotent and can be re-run after a failure: the target copy is replaced,
+# and a bucket whose rows already left the source is just re-pointed.
+import argparse
+import asyncio
+from collections import defaultdict
+
+from main import ShardRouter, config, init_shard_schema
+
+# (table, rows belonging to the moved accounts $1), parents first
+BUCKET_TABLES = [
+    ("accounts", "id = ANY($1::uuid[])"),
+    ("payment_schedules", "account_id = ANY($1::uuid[])"),
+    ("service_payments", "account_id = ANY($1::uuid[])"),
+    ("deposits", "account_id = ANY($1::uuid[])"),
+    ("withdrawals", "account_id = ANY($1::uuid[])"),
+    ("transfers", "from_account = ANY($1::uuid[])"),
+    ("transfer_credits", "to_account = ANY($1::uuid[])"),
+    ("transactions", "from_account = ANY($1::uuid[]) OR to_account = ANY($1::uuid[])"),
+]
+
+def plan_moves(bucket_map, shards: int, max_buckets: int):
+    """Move buckets from the fullest shards to the emptiest until counts differ by at most one."""
+    owned = defaultdict(list)
+    for bucket, shard in enumerate(bucket_map):
+        owned[shard].append(bucket)
+    target = [len(bucket_map) // shards + (1 if shard < len(bucket_map) % shards else 0) for shard in range(shards)]
+    surplus = [bucket for shard in range(shards) for bucket in owned[shard][target[shard]:]]
+    moves = []
+    for shard in range(shards):
+        for _ in range(target[shard] - len(owned[shard])):
+            bucket = surplus.pop()
+            moves.append((bucket, bucket_map[bucket], shard))
+    return moves[:max_buckets]
+
+async def move_bucket(router, bucket: int, source: int, target: int, account_ids):
+    if account_ids:
+        async with router.pools[source].acquire() as src, router.pools[target].acquire() as dst:
+            async with src.transaction():
+                # Same lock order as the scheduler (schedule, then account)
+                await src.execute("SELECT 1 FROM payment_schedules WHERE account_id = ANY($1::uuid[]) FOR UPDATE", account_ids)
+                await src.execute("SELECT 1 FROM accounts WHERE id = ANY($1::uuid[]) FOR UPDATE", account_ids)
+                in_flight = await src.fetchval(
+                    "SELECT count(*) FROM transfers WHERE from_account = ANY($1::uuid[]) AND status = 'debited'",
+                    account_ids
+                )
+                if in_flight:
+                    raise RuntimeError(f"{in_flight} transfers in flight")
+
+                rows = {table: await src.fetch(f"SELECT * FROM {table} WHERE {where}", account_ids)
+                        for table, where in BUCKET_TABLES}
+                async with dst.transaction():
+                    for table, where in reversed(BUCKET_TABLES):
+                        await dst.execute(f"DELETE FROM {table} WHERE {where}", account_ids)
+                    for table, _ in BUCKET_TABLES:
+                        if rows[table]:
+                            await dst.copy_records_to_table(table, records=rows[table], columns=list(rows[table][0].keys()))
+                for table, where in reversed(BUCKET_TABLES):
+                    await src.execute(f"DELETE FROM {table} WHERE {where}", account_ids)
+
+    await router.directory.execute(
+        "UPDATE shard_buckets SET shard = $2, moving = FALSE, updated_at = CURRENT_TIMESTAMP WHERE bucket = $1",
+        bucket, target
+    )
+    print(f"bucket {bucket}: shard {source} -> {target} ({len(account_ids)} accounts)")
+
+async def rebalance(args):
+    router = ShardRouter(config.SHARD_DATABASE_URLS, config.SHARD_VIRTUAL_BUCKETS)
+    await router.connect(1, 2)
+    try:
+        # The target shard may be new; the schema is idempotent
+        await router.gather(init_shard_schema)
+        await router.load_bucket_map()
+        if args.bucket is not None:
+            if not (0 <= args.bucket < len(router.bucket_map) and 0 <= args.to < len(router.pools)):
+                raise SystemExit("--bucket or --to out of range")
+            moves = [(args.bucket, router.bucket_map[args.bucket], args.to)] if router.bucket_map[args.bucket] != args.to else []
+        else:
+            moves = plan_moves(router.bucket_map, len(router.pools), args.max_buckets)
+
+        counts = defaultdict(int)
+        for shard in router.bucket_map:
+            counts[shard] += 1
+        print("buckets per shard:", {shard: counts[shard] for shard in range(len(router.pools))})
+        print(f"{len(moves)} buckets to move")
+        if args.dry_run or not moves:
+            return
+
+        buckets = [bucket for bucket, _, _ in moves]
+        await router.directory.execute("UPDATE shard_buckets SET moving = TRUE WHERE bucket = ANY($1::int[])", buckets)
+        try:
+            print(f"waiting {args.settle_seconds}s for the pods to stop serving the moving buckets")
+            await asyncio.sleep(args.settle_seconds)
+
+            account_ids = defaultdict(list)
+            for source in {source for _, source, _ in moves}:
+                for row in await router.pools[source].fetch("SELECT id FROM accounts"):
+                    account_ids[router.bucket_for(row['id'])].append(row['id'])
+
+            for bucket, source, target in moves:
+                try:
+                    await move_bucket(router, bucket, source, target, account_ids[bucket])
+                except Exception as e:
+                    print(f"bucket {bucket}: skipped ({e})")
+        finally:
+            # Buckets that failed stay on their source shard
+            await router.directory.execute("UPDATE shard_buckets SET moving = FALSE WHERE bucket = ANY($1::int[])", buckets)
+    finally:
+        await router.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Move account buckets between shards")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--max-buckets", type=int, default=32, help="buckets moved per run")
+    parser.add_argument("--bucket", type=int, help="move only this bucket (with --to)")
+    parser.add_argument("--to", type=int, help="target shard for --bucket")
+    parser.add_argument("--settle-seconds", type=float, default=config.SHARD_MAP_REFRESH_SECONDS * 2 + 5)
+    args = parser.parse_args()
+    if (args.bucket is None) != (args.to is None):
+        parser.error("--bucket and --to go together")
+    asyncio.run(rebalance(args))
+
+if __name__ == "__main__":
+    main()
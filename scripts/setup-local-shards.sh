@@ -0,0 +1,42 @@
+#!/bin/bash
+
+# Banking K8s Infrastructure - Local account shards
+# Creates N shard databases on the docker-compose Postgres instance and prints
+# the SHARD_DATABASE_URLS value for the backend. Shard 0 is the existing
+# banking_db, which also keeps the users table (directory).
+
+set -e
+
+# Colors
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+BLUE='\033[0;34m'
+NC='\033[0m' # No Color
+
+SHARDS=${1:-2}
+CONTAINER=${POSTGRES_CONTAINER:-banking-postgres}
+DB_USER=${POSTGRES_USER:-banking_user}
+DB_PASSWORD=${POSTGRES_PASSWORD:-secure_password_123}
+DB_HOST=${DB_HOST:-localhost}
+
+echo -e "${BLUE}🗄️ Creando ${SHARDS} shards en ${CONTAINER}${NC}"
+echo "=================================================="
+
+URLS="postgresql://${DB_USER}:${DB_PASSWORD}@${DB_HOST}:5432/banking_db"
+for ((i = 1; i < SHARDS; i++)); do
+    DB_NAME="banking_shard_${i}"
+    if docker exec "$CONTAINER" psql -U "$DB_USER" -d banking_db -tAc "SELECT 1 FROM pg_database WHERE datname = '${DB_NAME}'" | grep -q 1; then
+        echo -e "${YELLOW}   ⏭️ ${DB_NAME} ya existe${NC}"
+    else
+        docker exec "$CONTAINER" psql -U "$DB_USER" -d banking_db -c "CREATE DATABASE ${DB_NAME}" >/dev/null
+        echo -e "${GREEN}   ✅ ${DB_NAME} creada${NC}"
+    fi
+    URLS="${URLS},postgresql://${DB_USER}:${DB_PASSWORD}@${DB_HOST}:5432/${DB_NAME}"
+done
+
+echo ""
+echo -e "${GREEN}Exporta esta variable antes de arrancar el backend (las tablas se crean al iniciar):${NC}"
+echo "export SHARD_DATABASE_URLS=\"${URLS}\""
+echo ""
+echo -e "${YELLOW}Si banking_db ya tenía cuentas, siguen en el shard 0; repártelas con:${NC}"
+echo "cd app/backend && python rebalance_shards.py"